@@ -1,34 +1,226 @@
 import streamlit as st
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.chains import LLMChain
 import re
+import json
+import contextlib
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import metrics
+from cv_sections import chunk_sections, estimate_tokens, split_sections
+from llm_cache import ResponseCache, make_key
+from local_analysis import analyze, format_findings
+from router import Provider, Router, build_provider
+from scheduler import CallCancelled, LLMError, RateLimitError, RequestScheduler, parse_rate_limit
 
-groq = st.secrets["Groq_API_Key"]
+MODEL = "llama-3.1-70b-versatile"
 
+# The providers are built on the first call (see get_router). Assign a chat model to llm to send every
+# call to it instead, or a Router to router to use other providers and routes.
+llm = None
+router = None
 
+# Maximum number of prompts sent to the llm at the same time by evaluate_all
+MAX_CONCURRENCY = 5
 
-llm = ChatGroq(
-    model="llama-3.1-70b-versatile",
-    groq_api_key=groq,
-    temperature=0
-    # other params...
+RATE_LIMIT_MESSAGE = "This app uses free Groq API. API call Rate limit exceeded."
+ERROR_PREFIX = "An error occurred:"
+
+# Tokens reserved for the reply when estimating a call's share of the tokens-per-minute quota
+REPLY_TOKEN_ALLOWANCE = 1024
+
+# One scheduler per process, so every Streamlit session shares the same Groq quota
+scheduler = RequestScheduler(
+    requests_per_minute=st.secrets.get("Groq_Requests_Per_Minute", 30),
+    tokens_per_minute=st.secrets.get("Groq_Tokens_Per_Minute"),
+    max_concurrency=st.secrets.get("Groq_Max_Concurrency", 10),
 )
 
-def check_for_rate_limit_error(response_content):
-    """Checks if the response content contains a Groq rate limit error."""
-    error_pattern = r"Rate limit reached.*in (\d+m\d+\.\d+s)"
-    match = re.search(error_pattern, response_content)
-    if match:
-        wait_time = match.group(1)
-        # Return an error message string instead of using st.error
-        return f"This app uses free Groq API. API call Rate limit exceeded. Please try again in {wait_time}."
-    return False
+# Responses are cached per prompt call, so draft_new and summary hit whenever their five inputs did
+response_cache = ResponseCache(
+    st.secrets.get("LLM_Cache_Path", ".llm_cache.sqlite3"),
+    enabled=st.secrets.get("LLM_Cache_Enabled", True),
+)
+
+# Per-call JSON logs go to stderr; Prometheus metrics are written to a file, and served on a port
+# by the entry points (the app's Metrics_Port secret, --metrics-port of batch.py and service.py)
+if st.secrets.get("Metrics_Log", True):
+    metrics.enable_json_logs()
+METRICS_FILE = st.secrets.get("Metrics_File")
+
+# CVs longer than this many tokens are reviewed section by section, in chunks of at most this size
+CV_TOKEN_BUDGET = st.secrets.get("CV_Token_Budget", 3000)
+
+@st.cache_resource
+def _configured_router():
+    """Builds the Router described by the Providers and Routing secrets, once per process.
+
+    Without them every call goes to MODEL on Groq, as the "groq" provider, under scheduler. Each
+    provider's client library is only imported here, on the first call, and each client keeps one
+    pool of HTTP connections shared by every session. For example:
+
+        [Providers.groq_fast]
+        kind = "groq"
+        model = "llama-3.1-8b-instant"
+
+        [Providers.cohere]
+        kind = "cohere"
+        model = "command-r"
+        api_key = "..."
+        requests_per_minute = 20
+
+        [Routing]
+        default = ["groq", "cohere"]
+        struct = ["groq_fast", "groq"]
+        verb = ["groq_fast", "groq"]
+        hedge_after = 8.0
+    """
+    settings = {name: dict(values) for name, values in st.secrets.get("Providers", {}).items()}
+    routing = dict(st.secrets.get("Routing", {}))
+    routes = {name: list(value) for name, value in routing.items() if isinstance(value, (list, tuple))}
+    default = routes.pop("default", ["groq"])
+    # Only the providers some route uses are built, so unused ones need no key or client library
+    providers = {}
+    for name in set(default).union(*routes.values()):
+        if name == "groq" and name not in settings:
+            providers[name] = build_provider(name, {"kind": "groq", "model": MODEL, "api_key": st.secrets["Groq_API_Key"]},
+                                             scheduler)
+        else:
+            providers[name] = build_provider(name, settings[name])
+    return Router(providers, routes, default, hedge_after=routing.get("hedge_after"),
+                  failure_threshold=routing.get("failure_threshold", 3), cooldown=routing.get("cooldown", 60.0))
+
+def get_router():
+    """Returns router if one was assigned, a single-provider Router for llm if that was, or the configured Router."""
+    if router is not None:
+        return router
+    if llm is not None:
+        return Router({"llm": Provider("llm", llm, scheduler)})
+    return _configured_router()
+
+# The LLM calls in flight for the evaluation running in this context are limited by this semaphore (see evaluate_all)
+_call_slots = contextvars.ContextVar("call_slots", default=None)
+
+def _estimate_tokens(template, inputs):
+    """Roughly estimates the tokens a call will use: about 4 characters per prompt token plus the reply."""
+    prompt_chars = len(template) + sum(len(str(value)) for value in inputs.values())
+    return prompt_chars // 4 + REPLY_TOKEN_ALLOWANCE
+
+def _run_chain(template, inputs, on_token=None, priority=0, validate=None, name="llm", max_tokens=None):
+    """Runs the template through the llm and returns the response text.
+
+    When on_token is given the response is streamed and on_token is called with each chunk of text.
+    Successful responses are served from and stored in response_cache. Calls wait their turn in the
+    shared scheduler, lower priority first, and are retried when rate limited. Raises RateLimitError
+    if the rate limit persists and LLMError for any other failure. validate, if given, is called
+    with the response text and may raise LLMError to keep a malformed response out of the cache.
+    max_tokens caps the length of the reply.
+
+    The provider is chosen by the router from the route for name, which fails over to the next
+    provider on errors and may hedge slow calls.
 
-def CVstruct_prompt(cv_content):
-    template = """
+    Every call is recorded with metrics.record under name: wall time, queueing time, time to first
+    token, token usage, retries, the provider that answered and whether it was rate limited.
+    """
+    start = time.perf_counter()
+    llm_router = get_router()
+    primary = llm_router.route(name)[0]
+    key_inputs = inputs if max_tokens is None else {**inputs, "max_tokens": max_tokens}
+    key = make_key(template, key_inputs, llm_router.model_key(name), getattr(primary.llm, "temperature", None))
+    cached = response_cache.get(key)
+    if cached is not None:
+        if on_token is not None:
+            on_token(cached)
+        metrics.record("llm_call", name=name, status="ok", cache_hit=True, seconds=time.perf_counter() - start)
+        return cached
+
+    from langchain_core.prompts import ChatPromptTemplate
+
+    prompt = ChatPromptTemplate.from_template(template)
+    stats = {"attempts": 0, "rate_limited": False, "started": None, "first_token": None, "usage": None, "provider": None}
+
+    def call(provider, claim, emit):
+        stats["attempts"] += 1
+        stats["started"] = stats["started"] or time.perf_counter()
+        chain = prompt | (provider.llm.bind(max_tokens=max_tokens) if max_tokens else provider.llm)
+        try:
+            if on_token is None:
+                response = chain.invoke(inputs)
+                content = response.content
+                claim()
+                stats["provider"] = provider.name
+                stats["usage"] = response.usage_metadata
+            else:
+                parts = []
+                for chunk in chain.stream(inputs):
+                    if not parts:
+                        claim()
+                        stats["provider"] = provider.name
+                    stats["first_token"] = stats["first_token"] or time.perf_counter()
+                    stats["usage"] = chunk.usage_metadata or stats["usage"]
+                    parts.append(chunk.content)
+                    emit(chunk.content)
+                content = "".join(parts)
+        except LLMError:
+            # Raised by claim, or by on_token, e.g. to cancel a draft
+            raise
+        except Exception as e:
+            wait = parse_rate_limit(str(e))
+            if wait is not None:
+                stats["rate_limited"] = True
+                raise RateLimitError(f"{RATE_LIMIT_MESSAGE} Please try again in {wait:.1f}s.", wait or None) from e
+            raise LLMError(f"{ERROR_PREFIX} {e}") from e
+        # Check for rate limit error in the response content
+        wait = parse_rate_limit(content)
+        if wait is not None:
+            stats["rate_limited"] = True
+            raise RateLimitError(f"{RATE_LIMIT_MESSAGE} Please try again in {wait:.1f}s.", wait or None)
+        return content
+
+    def record(status, error=None):
+        usage = stats["usage"] or {}
+        metrics.record(
+            "llm_call",
+            name=name,
+            status=status,
+            cache_hit=False,
+            seconds=time.perf_counter() - start,
+            queue_seconds=(stats["started"] or time.perf_counter()) - start,
+            first_token_seconds=stats["first_token"] - start if stats["first_token"] else None,
+            input_tokens=usage.get("input_tokens"),
+            output_tokens=usage.get("output_tokens"),
+            retries=max(0, stats["attempts"] - 1),
+            provider=stats["provider"],
+            rate_limited=stats["rate_limited"],
+            error=error,
+        )
+
+    try:
+        with _call_slots.get() or contextlib.nullcontext():
+            content = llm_router.run(name, call, priority, _estimate_tokens(template, inputs), on_token)
+        if validate is not None:
+            validate(content)
+    except RateLimitError as e:
+        record("rate_limited", str(e))
+        raise
+    except CallCancelled as e:
+        record("cancelled", str(e))
+        raise
+    except LLMError as e:
+        record("error", str(e))
+        raise
+    record("ok")
+    response_cache.put(key, content)
+    return content
+
+EXPERT_PREAMBLE = """
             You are an expert CV evaluation assistant.
-            Your task is to rigorously evaluate the provided CV content {cv_content} for the CV Structure and Formatting Best Practices.
+            Each document is given once, in the delimited blocks above.
+"""
+
+STRUCT_INSTRUCTIONS = """
+            Your task is to rigorously evaluate the CV in the <cv> block for the CV Structure and Formatting Best Practices.
             Focus on consistency in font style, section headers, use of bullet points, margins, and alignment.
             Assess whether the layout is clean and easy to read, including the proper usage of reverse chronological order for experiences.
             Provide suggestions for improvements if any formatting inconsistencies or readability issues are found.
@@ -49,27 +241,9 @@ def CVstruct_prompt(cv_content):
             3. Suggestions for Improvement: Numbered list with detailed suggestions
             4. Score: A score out of 100 (e.g. Score: 65/100)
             """
-    prompt = ChatPromptTemplate.from_template(template)
-    chain = prompt | llm
-    try:
-        response = chain.invoke({"cv_content": cv_content})
-        # Check for rate limit error in the response content
-        error_message = check_for_rate_limit_error(response.content) 
-        if error_message:
-            return error_message # Return the error string
-        else: 
-            return response.content
-    except Exception as e:
-        error_message = check_for_rate_limit_error(str(e))
-        if error_message:
-            return error_message # Return the error string
-        else: 
-            return f"An error occurred: {e}"
-
-def actVerb_prompt(cv_content, job_description):
-    template = """
-            You are an expert CV evaluation assistant.
-            Your task is to rigorously evaluate the provided CV content {cv_content} for Action Verbs Usage best practices.
+
+VERB_INSTRUCTIONS = """
+            Your task is to rigorously evaluate the CV in the <cv> block for Action Verbs Usage best practices.
             Analyze the usage of action verbs throughout the CV.
             Ensure that each bullet point begins with a strong, dynamic action verb that effectively conveys the candidate's skills and achievements.
             Check if the action verbs vary and are tailored to highlight leadership, technical, or communication skills.
@@ -77,7 +251,7 @@ def actVerb_prompt(cv_content, job_description):
             Following are some examples of action verb usage best practices:
             1. Use varied and impactful action verbs to begin each bullet point, showcasing specific actions taken (e.g., developed, managed, coordinated).
             2. Replace generic phrases like “responsible for” or “duties include” with dynamic action verbs.
-            3. Align choice of verbs with the industry or job role {job_description} for which the CV {cv_content} will be used to apply (e.g., "engineered" for technical roles, "negotiated" for management).
+            3. Align choice of verbs with the industry or job role in the <job_description> block for which the CV will be used to apply (e.g., "engineered" for technical roles, "negotiated" for management).
             4. Diversify your verb usage to cover different skills such as leadership, communication, problem-solving, and technical expertise.
                
             Apply a strict grading standard, similar to tough marking in an exam.
@@ -88,27 +262,9 @@ def actVerb_prompt(cv_content, job_description):
             3. Suggestions for Improvement: Numbered list with detailed suggestions
             4. Score: A score out of 100 (e.g. Score: 65/100)
             """
-    prompt = ChatPromptTemplate.from_template(template)
-    chain = prompt | llm
-    try:
-        response = chain.invoke({"cv_content": cv_content, "job_description": job_description})
-        # Check for rate limit error in the response content
-        error_message = check_for_rate_limit_error(response.content) 
-        if error_message:
-            return error_message # Return the error string
-        else: 
-            return response.content
-    except Exception as e:
-        error_message = check_for_rate_limit_error(str(e))
-        if error_message:
-            return error_message # Return the error string
-        else: 
-            return f"An error occurred: {e}"
-
-def CVcontent_prompt(cv_content, job_description):
-    template = """
-            You are an expert CV evaluation assistant.
-            Your task is to rigorously evaluate the provided CV content {cv_content} for CV content quality best practices.
+
+CONTENT_INSTRUCTIONS = """
+            Your task is to rigorously evaluate the CV in the <cv> block for CV content quality best practices.
             Examine the quality of the CV content, focusing on how effectively the candidate highlights accomplishments rather than listing job responsibilities.
             Check for the use of quantifiable results where applicable, relevance of listed experiences, and the inclusion of industry-specific keywords.
             Ensure the content is concise and avoids unnecessary personal details or pronouns.
@@ -116,7 +272,7 @@ def CVcontent_prompt(cv_content, job_description):
             Following are some examples of CV Content Quality best practices:
             1. Where possible, use numbers to describe the scale or impact of your accomplishments (e.g., increased sales by 20%).
             2. Highlight specific outcomes and contributions rather than listing job responsibilities.
-            3. Incorporate industry-specific terms and keywords from the job description {job_description} to improve relevance.
+            3. Incorporate industry-specific terms and keywords from the job description in the <job_description> block to improve relevance.
             4. Write in the third person without using "I," "me," or "my".
             5. Keep content brief and to the point, focusing only on the most relevant experiences for the position.
 
@@ -128,30 +284,12 @@ def CVcontent_prompt(cv_content, job_description):
             3. Suggestions for Improvement: Numbered list with detailed suggestions
             4. Score: A score out of 100 (e.g. Score: 65/100)
             """
-    prompt = ChatPromptTemplate.from_template(template)
-    chain = prompt | llm
-    try:
-        response = chain.invoke({"cv_content": cv_content, "job_description": job_description})
-        # Check for rate limit error in the response content
-        error_message = check_for_rate_limit_error(response.content) 
-        if error_message:
-            return error_message # Return the error string
-        else: 
-            return response.content
-    except Exception as e:
-        error_message = check_for_rate_limit_error(str(e))
-        if error_message:
-            return error_message # Return the error string
-        else: 
-            return f"An error occurred: {e}"
-
-def ATS_prompt(cv_content, job_description):
-    template = """
-            You are an expert CV evaluation assistant.
-            Your task is to rigorously evaluate the provided CV content {cv_content} for ATS compatibility best practices.
+
+ATS_INSTRUCTIONS = """
+            Your task is to rigorously evaluate the CV in the <cv> block for ATS compatibility best practices.
             Assess the CV's compatibility with Applicant Tracking Systems (ATS).
             Ensure that it uses simple formatting without complex tables, columns, or images.
-            Verify that appropriate keywords from the job description {job_description} or industry standards are incorporated, and that the file is likely to be parsed correctly by ATS.
+            Verify that appropriate keywords from the job description in the <job_description> block or industry standards are incorporated, and that the file is likely to be parsed correctly by ATS.
             Suggest any necessary changes to improve ATS readability, such as modifying section headings or avoiding special characters.
             Following are some examples of ATS compatibility best practices:
             1. Avoid unusual fonts, images, or special characters that could confuse Applicant Tracking Systems (ATS).
@@ -167,67 +305,226 @@ def ATS_prompt(cv_content, job_description):
             3. Suggestions for Improvement: Numbered list with detailed suggestions
             4. Score: A score out of 100 (e.g. Score: 65/100)
             """
-    prompt = ChatPromptTemplate.from_template(template)
-    chain = prompt | llm
-    try:
-        response = chain.invoke({"cv_content": cv_content, "job_description": job_description})
-        # Check for rate limit error in the response content
-        error_message = check_for_rate_limit_error(response.content) 
-        if error_message:
-            return error_message # Return the error string
-        else: 
-            return response.content
-    except Exception as e:
-        error_message = check_for_rate_limit_error(str(e))
-        if error_message:
-            return error_message # Return the error string
-        else: 
-            return f"An error occurred: {e}"
-
-def jobRole_prompt(cv_content, job_description):
-    template = """
-            You are an expert CV evaluation assistant.
-            Your task is to rigorously evaluate the provided CV content {cv_content} for the provided job role description {job_description}.
+
+ROLE_INSTRUCTIONS = """
+            Your task is to rigorously evaluate the CV in the <cv> block for the job role description in the <job_description> block.
             Evaluate the alignment of the CV with the specific job role description.
             Compare the candidate's skills, education, and experience with the requirements of the role.
             Focus on how well the listed qualifications match the job description, including relevant keywords, skills, and achievements.
             Identify gaps in relevance or opportunities to better tailor the CV for the job application.
             Following are some examples of matching the CV content with the job role description:
-            1. Meticulously compare Matching Skills, skills, experience and education listed in the CV with those required in the job description: {job_description}.
+            1. Meticulously compare Matching Skills, skills, experience and education listed in the CV with those required in the job description.
             2. Identify any gaps or matches in skills and experiences, focusing on alignment with job requirements.
             3. Deduct points for significant mismatches or omissions.
 
             Apply a strict grading standard, similar to tough marking in an exam.
-            Extract the skills from {cv_content} and required skills from the {job_description} and provide a numbered list of skills that are matching between {cv_content} and {job_description}
+            Extract the skills from the CV and the required skills from the job description and provide a numbered list of skills that are matching between them.
 
             The result should be following format:
             1. Overall Job Role Compatibility: Numbered list with detailed analysis
             2. Section-by-section analysis: Numbered list with detailed analysis
             3. Suggestions for Improvement: Numbered list with detailed suggestions
-            4. Matching Skills: A numbered list of skills that are matching between {cv_content} and {job_description}
+            4. Matching Skills: A numbered list of skills that are matching between the CV and the job description
             4. Score: A score out of 100 (e.g. Score: 65/100)
 
             """
-    prompt = ChatPromptTemplate.from_template(template)
-    chain = prompt | llm
+
+# Each document is sent once per prompt, as a delimited block the instructions refer to by name
+DOCUMENT_BLOCKS = {
+    "cv_content": "<cv>\n{cv_content}\n</cv>\n",
+    "job_description": "<job_description>\n{job_description}\n</job_description>\n",
+    "cv_notes": (
+        "<cv_notes>\n"
+        "The CV was too long to review in one pass. These are reviewers' notes on each of its parts, in order.\n"
+        "{cv_notes}\n"
+        "</cv_notes>\n"
+    ),
+    "cv_section": "<cv_section>\n{cv_section}\n</cv_section>\n",
+    "local_findings": (
+        "<precomputed_checks>\n"
+        "These counts were computed exactly from the CV text; rely on them instead of recounting.\n"
+        "{local_findings}\n"
+        "</precomputed_checks>\n"
+    ),
+}
+
+def assemble_prompt(instructions, *documents):
+    """Builds a template that puts each named document once, ahead of the instructions that use it.
+
+    Documents come first so that every prompt about the same CV starts with the same text.
+    """
+    return "".join(DOCUMENT_BLOCKS[name] for name in documents) + EXPERT_PREAMBLE + instructions
+
+def _document_inputs(cv_content, job_description=None):
+    """Returns the template inputs for the document blocks, including the local checks on the CV."""
+    inputs = {"cv_content": cv_content, "local_findings": format_findings(analyze(cv_content, job_description or ""))}
+    if job_description is not None:
+        inputs["job_description"] = job_description
+    return inputs
+
+# Reply budget for the notes on one part of a long CV
+SECTION_NOTES_MAX_TOKENS = 300
+
+SECTION_NOTES_INSTRUCTIONS = """
+            The <cv_section> block holds one part of a longer CV: {section_names}.
+            Review only this part, against the criteria below; where they speak of the CV, apply them to this part.
+            Another reviewer will combine your notes on every part into one report, so reply with short notes
+            only: strengths, problems and concrete suggestions as bullet points, then a score for this part
+            out of 100 (e.g. Score: 65/100).
+            """
+
+# The criteria are written for a whole CV in the <cv> block; the per-section prompt points them at its one part
+SECTION_CRITERIA_REWRITES = (
+    ("evaluate the CV in the <cv> block", "evaluate the part of the CV in the <cv_section> block"),
+    ("throughout the CV", "throughout this part of the CV"),
+    ("Assess the CV's compatibility", "Assess this part's compatibility"),
+    ("Evaluate the alignment of the CV", "Evaluate the alignment of this part of the CV"),
+    ("Examine the quality of the CV content", "Examine the quality of this part's content"),
+    ("Extract the skills from the CV", "Extract the skills from this part of the CV"),
+)
+
+def _section_criteria(name):
+    """Returns a dimension's criteria reworded for one part of the CV in the <cv_section> block."""
+    criteria = _criteria(DIMENSION_HEADINGS[name][1])
+    for whole, part in SECTION_CRITERIA_REWRITES:
+        criteria = criteria.replace(whole, part)
+    return criteria
+
+def _section_notes(name, cv_content, job_description=None):
+    """Reviews each section chunk of a long CV on one dimension, in parallel, and returns the notes joined in CV order.
+
+    Each chunk is its own cached call, so when a CV is submitted again only its changed sections are reviewed again.
+    """
+    documents = ("cv_section", "job_description") if job_description is not None else ("cv_section",)
+    template = assemble_prompt(SECTION_NOTES_INSTRUCTIONS + _section_criteria(name), *documents)
+    chunks = chunk_sections(split_sections(cv_content), CV_TOKEN_BUDGET)
+    with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+        futures = [
+            metrics.submit(pool, _run_chain, template, {"cv_section": chunk.text, "section_names": chunk.name,
+                                                 **({"job_description": job_description} if job_description is not None else {})},
+                    name=f"{name}_section", max_tokens=SECTION_NOTES_MAX_TOKENS)
+            for chunk in chunks
+        ]
+        notes = [future.result() for future in futures]
+    return "\n\n".join(f"#### {chunk.name}\n{text}" for chunk, text in zip(chunks, notes))
+
+def _cv_prompt(name, instructions, cv_content, job_description=None):
+    """Returns the (template, inputs) that evaluate the CV on one dimension with instructions.
+
+    A CV over CV_TOKEN_BUDGET tokens is not sent whole: its sections are reviewed separately
+    (_section_notes) and the template reduces their notes into the report the instructions ask for.
+    """
+    documents = ("job_description", "local_findings") if job_description is not None else ("local_findings",)
+    inputs = _document_inputs(cv_content, job_description)
+    if estimate_tokens(cv_content) <= CV_TOKEN_BUDGET:
+        return assemble_prompt(instructions, "cv_content", *documents), inputs
+    inputs.pop("cv_content")
+    inputs["cv_notes"] = _section_notes(name, cv_content, job_description)
+    return assemble_prompt(instructions.replace("the <cv> block", "the <cv_notes> block"), "cv_notes", *documents), inputs
+
+def CVstruct_prompt(cv_content, on_token=None):
+    template, inputs = _cv_prompt("struct", STRUCT_INSTRUCTIONS, cv_content)
+    return _run_chain(template, inputs, on_token, name="struct")
+
+def actVerb_prompt(cv_content, job_description, on_token=None):
+    template, inputs = _cv_prompt("verb", VERB_INSTRUCTIONS, cv_content, job_description)
+    return _run_chain(template, inputs, on_token, name="verb")
+
+def CVcontent_prompt(cv_content, job_description, on_token=None):
+    template, inputs = _cv_prompt("content", CONTENT_INSTRUCTIONS, cv_content, job_description)
+    return _run_chain(template, inputs, on_token, name="content")
+
+def ATS_prompt(cv_content, job_description, on_token=None):
+    template, inputs = _cv_prompt("ats", ATS_INSTRUCTIONS, cv_content, job_description)
+    return _run_chain(template, inputs, on_token, name="ats")
+
+def jobRole_prompt(cv_content, job_description, on_token=None):
+    template, inputs = _cv_prompt("role", ROLE_INSTRUCTIONS, cv_content, job_description)
+    return _run_chain(template, inputs, on_token, name="role")
+
+# Headings that separate the five analyses in the single-call response
+DIMENSION_HEADINGS = {
+    "struct": ("Structure and Formatting", STRUCT_INSTRUCTIONS),
+    "verb": ("Action Verbs Usage", VERB_INSTRUCTIONS),
+    "content": ("Content Quality", CONTENT_INSTRUCTIONS),
+    "ats": ("ATS Compatibility", ATS_INSTRUCTIONS),
+    "role": ("Job Role Match", ROLE_INSTRUCTIONS),
+}
+
+def _all_dimensions_template():
+    sections = "".join(
+        f"\n            ### {heading}\n{instructions}"
+        for heading, instructions in DIMENSION_HEADINGS.values()
+    )
+    return assemble_prompt(f"""
+            Carry out the five evaluations below in a single answer.
+            Start each evaluation with its heading line exactly as written (for example "### {DIMENSION_HEADINGS['struct'][0]}"),
+            keep the evaluations in the same order, and give each one its own result in the requested format.
+{sections}""", "cv_content", "job_description", "local_findings")
+
+def split_dimensions(response):
+    """Splits a single-call response into the five analyses, keyed like DIMENSIONS.
+
+    Raises LLMError naming any heading the model left out.
+    """
+    pattern = "|".join(re.escape(heading) for heading, _ in DIMENSION_HEADINGS.values())
+    parts = re.split(rf"^[#*\s]*({pattern})[#*:\s]*$", response, flags=re.M | re.I)
+    by_heading = {parts[i].lower(): parts[i + 1].strip() for i in range(1, len(parts) - 1, 2)}
+    missing = [heading for heading, _ in DIMENSION_HEADINGS.values() if not by_heading.get(heading.lower())]
+    if missing:
+        raise LLMError(f"{ERROR_PREFIX} the combined evaluation is missing: {', '.join(missing)}")
+    return {name: by_heading[heading.lower()] for name, (heading, _) in DIMENSION_HEADINGS.items()}
+
+def all_dimensions_prompt(cv_content, job_description):
+    """Evaluates all five dimensions in one request and returns their analyses, keyed like DIMENSIONS."""
+    template = _all_dimensions_template()
+    inputs = _document_inputs(cv_content, job_description)
+    return split_dimensions(_run_chain(template, inputs, validate=split_dimensions, name="all"))
+
+
+# Reply budget for a quick score; output tokens dominate the latency of a call
+QUICK_MAX_TOKENS = 250
+
+QUICK_FORMAT = """
+            Reply with only a JSON object and no other text, in this form:
+            {{"score": <score out of 100>, "findings": ["<finding>", "<finding>", "<finding>"]}}
+            Give at most 4 findings of at most 20 words each, most important first.
+            """
+
+def _criteria(instructions):
+    """Returns the evaluation criteria of a dimension's instructions, without the report format."""
+    return instructions.split("The result should be following format:")[0]
+
+def parse_quick_result(response):
+    """Parses a quick score reply into {"score": int, "findings": [str, ...]}, or raises LLMError."""
+    match = re.search(r"\{.*\}", response, re.S)
     try:
-        response = chain.invoke({"cv_content": cv_content, "job_description": job_description})
-        # Check for rate limit error in the response content
-        error_message = check_for_rate_limit_error(response.content) 
-        if error_message:
-            return error_message # Return the error string
-        else: 
-            return response.content
-    except Exception as e:
-        error_message = check_for_rate_limit_error(str(e))
-        if error_message:
-            return error_message # Return the error string
-        else: 
-            return f"An error occurred: {e}"
-    
-
-def draft_new(cv_content, job_description, suggest1, suggest2, suggest3, suggest4, suggest5):
-    template = """
+        result = json.loads(match.group(0)) if match else None
+        score = int(result["score"])
+        findings = [str(finding) for finding in result.get("findings", [])]
+    except (ValueError, TypeError, KeyError):
+        raise LLMError(f"{ERROR_PREFIX} the quick score reply was not valid JSON: {response[:200]}")
+    if not 0 <= score <= 100:
+        raise LLMError(f"{ERROR_PREFIX} the quick score {score} is not between 0 and 100")
+    return {"score": score, "findings": findings}
+
+def quick_prompt(name, cv_content, job_description, on_token=None):
+    """Asks for one dimension's score and a few findings only, and returns them parsed.
+
+    name is a key of DIMENSIONS. The reply is capped at QUICK_MAX_TOKENS tokens.
+    """
+    _, instructions = DIMENSION_HEADINGS[name]
+    template, inputs = _cv_prompt(name, _criteria(instructions) + QUICK_FORMAT, cv_content,
+                                  None if name == "struct" else job_description)
+    response = _run_chain(template, inputs, on_token, validate=parse_quick_result, name=f"quick_{name}",
+                          max_tokens=QUICK_MAX_TOKENS)
+    return parse_quick_result(response)
+
+def format_quick_result(result):
+    """Writes a quick score's findings as a markdown list, e.g. for draft_new's suggestion inputs."""
+    return "\n".join(f"- {finding}" for finding in result["findings"]) + f"\nScore: {result['score']}/100"
+
+DRAFT_TEMPLATE = """
             Draft a New CV based on following:
             1. Old CV: {cv_content}
             2. Job Role Description: {job_description}
@@ -238,34 +535,83 @@ def draft_new(cv_content, job_description, suggest1, suggest2, suggest3, suggest
             7. Old CV Job Role Description: {suggest5}
             """
 
-    prompt = ChatPromptTemplate.from_template(template)
-    chain = prompt | llm
-    try:
-        response = chain.invoke({
-            "cv_content": cv_content, 
-            "job_description": job_description, 
-            "suggest1": suggest1, 
-            "suggest2": suggest2, 
-            "suggest3": suggest3, 
-            "suggest4": suggest4, 
-            "suggest5": suggest5
-        })
-        # Check for rate limit error in the response content
-        error_message = check_for_rate_limit_error(response.content) 
-        if error_message:
-            return error_message # Return the error string
-        else: 
-            return response.content
-    except Exception as e:
-        error_message = check_for_rate_limit_error(str(e))
-        if error_message:
-            return error_message # Return the error string
-        else: 
-            return f"An error occurred: {e}"
+# Longest condensed suggestion text passed to draft_new for one dimension
+CONDENSED_CHARS = 1500
+SUGGESTIONS_PATTERN = re.compile(r"Suggestions for Improvement\W*(.*?)(?=Matching Skills|Score\s*:|\Z)", re.S | re.I)
+
+def condense_report(report):
+    """Cuts a dimension's full report down to its suggestions and score, the part draft_new needs."""
+    match = SUGGESTIONS_PATTERN.search(report)
+    suggestions = match.group(1) if match else report
+    # Drop the number of the heading that follows the suggestions, e.g. "4." before "Score:"
+    suggestions = re.sub(r"[\s*#]*\d+\.[\s*]*$", "", suggestions).strip()[:CONDENSED_CHARS]
+    score = extract_score(report)
+    return f"{suggestions}\nScore: {score}/100" if score else suggestions
+
+def draft_new(cv_content, job_description, suggest1, suggest2, suggest3, suggest4, suggest5, on_token=None):
+    return _run_chain(DRAFT_TEMPLATE, {
+        "cv_content": cv_content,
+        "job_description": job_description,
+        "suggest1": suggest1,
+        "suggest2": suggest2,
+        "suggest3": suggest3,
+        "suggest4": suggest4,
+        "suggest5": suggest5
+    }, on_token, priority=1, name="draft")
+
+
+class DraftCancelled(CallCancelled):
+    """Raised inside a DraftJob that was cancelled."""
+
+class DraftJob:
+    """Writes a new draft CV with draft_new in a background thread.
+
+    suggestions are the five condensed suggestion texts (see condense_report). The text streams
+    into a buffer that the caller polls with text(), since Streamlit may only update the page from
+    the script thread. cancel() stops the draft at its next chunk of text.
+    """
+
+    def __init__(self, cv_content, job_description, suggestions):
+        self.result = None
+        self.error = None
+        self._parts = []
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        metrics.start_thread(self._run, cv_content, job_description, suggestions)
 
+    def _on_token(self, text):
+        if self._cancelled.is_set():
+            raise DraftCancelled("The draft was cancelled")
+        self._parts.append(text)
 
-def summary(suggest1, suggest2, suggest3, suggest4, suggest5):
-    template = """
+    def _run(self, cv_content, job_description, suggestions):
+        try:
+            if self._cancelled.is_set():
+                raise DraftCancelled("The draft was cancelled")
+            self.result = draft_new(cv_content, job_description, *suggestions, on_token=self._on_token)
+        except LLMError as e:
+            self.error = e
+        except Exception as e:
+            self.error = LLMError(f"{ERROR_PREFIX} {e}")
+        finally:
+            self._done.set()
+
+    def text(self):
+        """Returns the draft written so far."""
+        return "".join(self._parts)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Waits up to timeout seconds for the draft to finish and returns whether it has."""
+        return self._done.wait(timeout)
+
+
+SUMMARY_TEMPLATE = """
             You are an expert in summarizing large text into smaller summaries.
             1. Summarize {suggest1} in 40 words.
             2. Summarize {suggest2} in 40 words.
@@ -274,25 +620,166 @@ def summary(suggest1, suggest2, suggest3, suggest4, suggest5):
             5. Summarize {suggest5} in 40 words.
             """
 
-    prompt = ChatPromptTemplate.from_template(template)
-    chain = prompt | llm
+def summary(suggest1, suggest2, suggest3, suggest4, suggest5, on_token=None):
+    return _run_chain(SUMMARY_TEMPLATE, {
+        "suggest1": suggest1,
+        "suggest2": suggest2,
+        "suggest3": suggest3,
+        "suggest4": suggest4,
+        "suggest5": suggest5
+    }, on_token, priority=1, name="summary")
+
+
+def extract_score(result_text):
+    match = re.findall(r"(\d+)/100", result_text)
+    if match:
+        return int(match[-1])
+    else:
+        return 0
+
+# Share of each dimension in the overall score
+SCORE_WEIGHTS = {"struct": 0.1, "verb": 0.1, "content": 0.1, "ats": 0.1, "role": 0.6}
+
+def overall_score(scores):
+    """Weights the five dimension scores into the overall score shown on the Summary tab."""
+    return round(sum(scores[name] * weight for name, weight in SCORE_WEIGHTS.items()), 2)
+
+# The five independent CV dimensions, in the order draft_new and summary expect them
+DIMENSIONS = {
+    "struct": lambda cv_content, job_description, on_token=None: CVstruct_prompt(cv_content, on_token),
+    "verb": actVerb_prompt,
+    "content": CVcontent_prompt,
+    "ats": ATS_prompt,
+    "role": jobRole_prompt,
+}
+
+def _emit(on_event, name, kind, text):
+    """Reports an evaluation event to on_event, if the caller asked for events."""
+    if on_event is not None:
+        on_event(name, kind, text)
+
+def _token_callback(on_event, name):
+    """Returns an on_token callback that reports streamed text for name, or None when nobody listens."""
+    if on_event is None:
+        return None
+    return lambda text: on_event(name, "token", text)
+
+def _collect(futures, results, errors, on_event=None):
+    """Waits for the futures and files each outcome under its name in results or errors."""
+    for future in as_completed(futures):
+        name = futures[future]
+        try:
+            results[name] = future.result()
+        except LLMError as e:
+            errors[name] = e
+        except Exception as e:
+            errors[name] = LLMError(f"{ERROR_PREFIX} {e}")
+        if name in errors:
+            _emit(on_event, name, "error", errors[name])
+        else:
+            _emit(on_event, name, "result", results[name])
+
+def _evaluate_together(cv_content, job_description, results, errors, on_event=None):
+    """Runs all_dimensions_prompt and files its five analyses, or its error, under each dimension."""
     try:
-        response = chain.invoke({ 
-            "suggest1": suggest1, 
-            "suggest2": suggest2, 
-            "suggest3": suggest3, 
-            "suggest4": suggest4, 
-            "suggest5": suggest5
-        })
-        # Check for rate limit error in the response content
-        error_message = check_for_rate_limit_error(response.content) 
-        if error_message:
-            return error_message # Return the error string
-        else: 
-            return response.content
+        analyses = all_dimensions_prompt(cv_content, job_description)
     except Exception as e:
-        error_message = check_for_rate_limit_error(str(e))
-        if error_message:
-            return error_message # Return the error string
-        else: 
-            return f"An error occurred: {e}"
+        analyses = {}
+        error = e if isinstance(e, LLMError) else LLMError(f"{ERROR_PREFIX} {e}")
+    for name in DIMENSIONS:
+        if name in analyses:
+            results[name] = analyses[name]
+            _emit(on_event, name, "result", results[name])
+        else:
+            errors[name] = error
+            _emit(on_event, name, "error", error)
+
+def evaluate_all(cv_content, job_description, max_concurrency=MAX_CONCURRENCY, on_event=None, single_call=False,
+                 quick=False):
+    """Evaluates the CV on all five dimensions concurrently, then writes the summary.
+
+    At most max_concurrency prompts are in flight at once, including the section reviews of long
+    CVs, which share one semaphore through the context. summary starts as soon as the last
+    dimension finishes. Returns a (results, errors) pair of dicts keyed by "struct", "verb",
+    "content", "ats", "role" and "summary"; a failing prompt only lands in errors, as an LLMError,
+    and never cancels the others. The new draft CV is not written here; start a DraftJob when it
+    is asked for.
+
+    With single_call the five dimensions are asked for in one request (all_dimensions_prompt),
+    which sends the CV and job description once instead of five times but cannot stream them.
+    CVs over CV_TOKEN_BUDGET tokens are still evaluated per dimension, section by section.
+
+    With quick each dimension only returns its score and a few findings (quick_prompt), as a
+    {"score", "findings"} dict, and there is no summary. The full report of a dimension
+    can be fetched later through DIMENSIONS.
+
+    If on_event is given, responses are streamed and on_event(name, kind, text) is called from the
+    worker threads with kind "token" for each chunk of text, then once per name with kind "result"
+    and the text or kind "error" and the LLMError.
+
+    All calls are recorded under the current metrics trace, or a new one if none is set.
+    """
+    start = time.perf_counter()
+    trace_id = metrics.current_trace() or metrics.start_trace()
+    results = {}
+    errors = {}
+    slots = _call_slots.set(threading.BoundedSemaphore(max_concurrency))
+    try:
+        _run_evaluation(cv_content, job_description, max_concurrency, on_event, single_call, quick, results, errors)
+    finally:
+        _call_slots.reset(slots)
+        metrics.record("evaluation", status="error" if errors else "ok", seconds=time.perf_counter() - start,
+                       failed=sorted(errors), quick=quick)
+        if METRICS_FILE:
+            metrics.write_prometheus(METRICS_FILE)
+    return results, errors
+
+def _run_evaluation(cv_content, job_description, max_concurrency, on_event, single_call, quick, results, errors):
+    """Does the work of evaluate_all, filling in results and errors."""
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        if quick:
+            futures = {metrics.submit(pool, quick_prompt, name, cv_content, job_description): name for name in DIMENSIONS}
+            _collect(futures, results, errors, on_event)
+            return
+        # A long CV is reviewed section by section, which a single call cannot do
+        if single_call and estimate_tokens(cv_content) <= CV_TOKEN_BUDGET:
+            _evaluate_together(cv_content, job_description, results, errors, on_event)
+        else:
+            futures = {
+                metrics.submit(pool, func, cv_content, job_description, on_token=_token_callback(on_event, name)): name
+                for name, func in DIMENSIONS.items()
+            }
+            _collect(futures, results, errors, on_event)
+
+        if errors:
+            # summary needs all five analyses as input
+            failed = ", ".join(name for name in DIMENSIONS if name in errors)
+            errors["summary"] = LLMError(f"Skipped because these evaluations failed: {failed}")
+            _emit(on_event, "summary", "error", errors["summary"])
+            return
+
+        suggestions = [results[name] for name in DIMENSIONS]
+        futures = {metrics.submit(pool, summary, *suggestions, on_token=_token_callback(on_event, "summary")): "summary"}
+        _collect(futures, results, errors, on_event)
+
+def stream_evaluation(cv_content, job_description, max_concurrency=MAX_CONCURRENCY, single_call=False, quick=False):
+    """Runs evaluate_all in a background thread and yields its (name, kind, text) events as they happen.
+
+    Use this from Streamlit, which may only update the page from the script thread.
+    """
+    events = queue.Queue()
+    finished = object()
+
+    def run():
+        try:
+            evaluate_all(cv_content, job_description, max_concurrency,
+                         on_event=lambda *event: events.put(event), single_call=single_call, quick=quick)
+        finally:
+            events.put(finished)
+
+    metrics.start_thread(run)
+    while True:
+        event = events.get()
+        if event is finished:
+            return
+        yield event
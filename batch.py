@@ -0,0 +1,250 @@
+"""Scores a directory of CV PDFs (or a manifest of CV/job description pairs) without the Streamlit page.
+
+    python batch.py --cv-dir cvs/ --job-description jd.txt --output results.jsonl
+    python batch.py --manifest pairs.csv --output results.jsonl
+
+    python batch.py --cv-dir cvs/ --job-description jd.txt --shortlist 20 --index cv_index/ --output results.jsonl
+
+The manifest is a CSV file with "cv" and "job_description" columns holding paths relative to the
+manifest. One JSON record is appended to the output per CV as soon as it finishes, and CVs that
+already have a record in the output are skipped, so an interrupted run picks up where it stopped.
+With --retry-failed, CVs whose records hold errors are evaluated again and get a new record; the
+last record of a CV is the one that counts.
+With --shortlist K, every CV is first ranked against its job description by a local TF-IDF
+index (shortlist.py) and only the top K of each job description are evaluated. With --index the
+CV texts are kept in that directory, so later runs only extract the CVs that are new or changed.
+Run it from the repository root so the Streamlit secrets (Groq_API_Key) are found.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import metrics
+from backend import DIMENSIONS, LLMError, condense_report, draft_new, evaluate_all, extract_score, overall_score
+from pdf_extract import extract_text
+from shortlist import ShortlistIndex
+
+
+def read_pdf_text(path):
+    """Returns the extracted text of the PDF at path. Runs in the extraction processes."""
+    with open(path, "rb") as f:
+        return extract_text(f.read()).text
+
+
+def read_job_description(path):
+    """Returns the text of the job description file at path."""
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def read_indexable_text(path):
+    """Returns the extracted text of the PDF at path, or "" when it cannot be read, so it ranks last."""
+    try:
+        return read_pdf_text(path)
+    except Exception:
+        return ""
+
+
+def directory_pairs(cv_dir, job_description_path):
+    """Yields (cv_path, job_description_path) for every PDF in cv_dir, in name order."""
+    for name in sorted(os.listdir(cv_dir)):
+        if name.lower().endswith(".pdf"):
+            yield os.path.join(cv_dir, name), job_description_path
+
+
+def manifest_pairs(manifest_path):
+    """Yields (cv_path, job_description_path) for every row of a CSV manifest."""
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield os.path.join(base, row["cv"]), os.path.join(base, row["job_description"])
+
+
+def shortlist_pairs(pairs, top_k, index_path=None, extract_workers=None):
+    """Returns the pairs of the top_k CVs of each job description, best first, by shortlist rank.
+
+    CVs not in the index at index_path, or changed since they were indexed, are extracted and
+    added to it first.
+    """
+    pairs = list(pairs)
+    index = ShortlistIndex(index_path)
+    stamps = {cv: str(os.stat(cv).st_mtime_ns) for cv in {cv for cv, _ in pairs}}
+    stale = sorted(cv for cv, stamp in stamps.items() if index.stamp(cv) != stamp)
+    with ProcessPoolExecutor(max_workers=extract_workers) as extractors:
+        for cv, text in zip(stale, extractors.map(read_indexable_text, stale, chunksize=8)):
+            index.add(cv, text, stamps[cv])
+    if index_path is not None and stale:
+        index.save()
+
+    candidates = {}
+    for cv, jd in pairs:
+        candidates.setdefault(jd, []).append(cv)
+    shortlisted = []
+    for jd, cvs in candidates.items():
+        try:
+            job_description = read_job_description(jd)
+        except (OSError, UnicodeDecodeError) as e:
+            # Passed on unranked, so that run() writes an error record for each of them
+            print(f"Could not read the job description {jd}: {e}", file=sys.stderr)
+            shortlisted.extend((cv, jd) for cv in cvs)
+            continue
+        ranking = index.rank(job_description, top_k, keys=cvs)
+        print(f"Shortlisted {len(ranking)} of {len(cvs)} CVs for {jd}", file=sys.stderr)
+        shortlisted.extend((cv, jd) for cv, _ in ranking)
+    return shortlisted
+
+
+def finished_pairs(output_path, retry_failed=False):
+    """Returns the (cv, job_description) pairs that already have a record in the output file.
+
+    With retry_failed, only records without errors count.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line of a crashed run may be cut short; that CV is simply evaluated again
+                continue
+            if retry_failed and record.get("errors"):
+                continue
+            done.add((record["cv"], record["job_description"]))
+    return done
+
+
+def _ends_with_newline(path):
+    """Checks that a crashed run did not leave half a line at the end of the file."""
+    with open(path, "rb") as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def evaluate_cv(cv_path, job_description_path, cv_content, job_description, max_concurrency, single_call, draft=False):
+    """Evaluates one CV and returns its output record; with draft, the record includes a new draft CV."""
+    record = {"cv": cv_path, "job_description": job_description_path, "trace_id": metrics.start_trace()}
+    if not cv_content.strip():
+        record["errors"] = {"extraction": "No text could be extracted from the PDF"}
+        return record
+    results, errors = evaluate_all(cv_content, job_description, max_concurrency, single_call=single_call)
+    scores = {name: extract_score(results[name]) for name in DIMENSIONS if name in results}
+    record["scores"] = scores
+    record["overall"] = overall_score(scores) if len(scores) == len(DIMENSIONS) else None
+    if draft and len(scores) == len(DIMENSIONS):
+        try:
+            results["draft"] = draft_new(cv_content, job_description,
+                                         *[condense_report(results[name]) for name in DIMENSIONS])
+        except LLMError as e:
+            errors["draft"] = e
+    record["results"] = results
+    record["errors"] = {name: str(error) for name, error in errors.items()}
+    return record
+
+
+def run(pairs, output_path, concurrency=4, extract_workers=None, max_concurrency=5, single_call=False, draft=False,
+        retry_failed=False):
+    """Evaluates every pair not already in output_path and appends one JSON line per CV as it finishes.
+
+    At most concurrency CVs are evaluated at once, each with up to max_concurrency prompts in
+    flight. A new PDF is only read when a record has been written, so memory never holds more
+    than 2 * concurrency CVs. A CV or job description that cannot be read gets an error record.
+    With retry_failed, pairs whose records hold errors are evaluated again.
+    """
+    done = finished_pairs(output_path, retry_failed)
+    pending = ((cv, jd) for cv, jd in pairs if (cv, jd) not in done)
+    job_descriptions = {}
+    written = 0
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ProcessPoolExecutor(max_workers=extract_workers) as extractors, \
+            ThreadPoolExecutor(max_workers=concurrency) as evaluators:
+        if not _ends_with_newline(output_path):
+            out.write("\n")
+        in_flight = {}
+
+        def submit_extraction():
+            pair = next(pending, None)
+            if pair is not None:
+                in_flight[extractors.submit(read_pdf_text, pair[0])] = ("extract", pair)
+
+        for _ in range(2 * concurrency):
+            submit_extraction()
+
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, (cv_path, jd_path) = in_flight.pop(future)
+                if stage == "extract":
+                    try:
+                        cv_content = future.result()
+                    except Exception as e:
+                        record = {"cv": cv_path, "job_description": jd_path,
+                                  "errors": {"extraction": f"Could not read the PDF: {e}"}}
+                    else:
+                        try:
+                            if jd_path not in job_descriptions:
+                                job_descriptions[jd_path] = read_job_description(jd_path)
+                        except (OSError, UnicodeDecodeError) as e:
+                            record = {"cv": cv_path, "job_description": jd_path,
+                                      "errors": {"job_description": f"Could not read the job description: {e}"}}
+                        else:
+                            evaluation = evaluators.submit(evaluate_cv, cv_path, jd_path, cv_content, job_descriptions[jd_path],
+                                                           max_concurrency, single_call, draft)
+                            in_flight[evaluation] = ("evaluate", (cv_path, jd_path))
+                            continue
+                else:
+                    record = future.result()
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                written += 1
+                print(f"[{written}] {cv_path}: {record.get('overall')}", file=sys.stderr)
+                submit_extraction()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score CV PDFs against job descriptions and write JSONL.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--cv-dir", help="directory of CV PDFs, all scored against --job-description")
+    source.add_argument("--manifest", help='CSV file with "cv" and "job_description" path columns')
+    parser.add_argument("--job-description", help="text file with the job description for --cv-dir")
+    parser.add_argument("--output", required=True, help="JSONL file to append results to")
+    parser.add_argument("--concurrency", type=int, default=4, help="CVs evaluated at the same time")
+    parser.add_argument("--extract-workers", type=int, default=None, help="processes used for PDF text extraction")
+    parser.add_argument("--max-concurrency", type=int, default=5, help="prompts in flight per CV")
+    parser.add_argument("--single-call", action="store_true", help="ask for all five dimensions in one request")
+    parser.add_argument("--draft", action="store_true", help="also write a new draft CV for every CV")
+    parser.add_argument("--shortlist", type=int, default=None, metavar="K",
+                        help="only evaluate the K CVs most similar to each job description")
+    parser.add_argument("--index", default=None, help="directory that keeps the shortlist index between runs")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="evaluate again the CVs whose records in the output hold errors")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve Prometheus metrics on this port")
+    args = parser.parse_args(argv)
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+
+    if args.cv_dir:
+        if not args.job_description:
+            parser.error("--cv-dir needs --job-description")
+        pairs = directory_pairs(args.cv_dir, args.job_description)
+    else:
+        pairs = manifest_pairs(args.manifest)
+    if args.shortlist is not None:
+        pairs = shortlist_pairs(pairs, args.shortlist, args.index, args.extract_workers)
+    elif args.index:
+        parser.error("--index needs --shortlist")
+    written = run(pairs, args.output, args.concurrency, args.extract_workers, args.max_concurrency, args.single_call,
+                  args.draft, args.retry_failed)
+    print(f"Wrote {written} records to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Measures PDF text extraction speed, in pages per second, for every installed extractor backend.
+
+    python benchmarks/extraction_speed.py [--pages 50] [--repeat 3]
+
+Runs on a text-dense PDF and an image-heavy PDF generated in a temporary directory. The limits
+in pdf_extract are lifted so every page is parsed, and the cache is bypassed.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pdf_extract
+from fixtures import write_pdf
+
+
+def pages_per_second(data, extractor, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pages = sum(1 for _ in pdf_extract.iter_pages(data, extractor))
+        best = min(best, time.perf_counter() - start)
+    return pages / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=50, help="pages in each test PDF")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the best is kept")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        documents = {}
+        for label, image_size in (("text", 0), ("images", 400)):
+            path = os.path.join(directory, f"{label}.pdf")
+            write_pdf(path, args.pages, image_size=image_size)
+            with open(path, "rb") as f:
+                documents[label] = f.read()
+
+        print(f"{'extractor':<10} " + " ".join(f"{label + ' (' + str(len(data) // 1024) + ' KB)':>20}" for label, data in documents.items()))
+        for extractor in pdf_extract.available_extractors():
+            speeds = [pages_per_second(data, extractor, args.repeat) for data in documents.values()]
+            print(f"{extractor:<10} " + " ".join(f"{speed:>14.1f} pages/s" for speed in speeds))
+
+        data = documents["text"]
+        start = time.perf_counter()
+        pdf_extract.extract_text(data)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        pdf_extract.extract_text(data)
+        warm = time.perf_counter() - start
+        print(f"extract_text with default limits: {cold * 1000:.1f} ms cold, {warm * 1000:.3f} ms cached")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Synthetic CV PDFs for the benchmarks, written without any PDF library, and their Streamlit secrets."""
+import json
+import os
+import random
+import zlib
+
+WORDS = (
+    "developed managed led designed built delivered improved reduced increased automated analysed "
+    "python sql spark airflow aws kubernetes data pipeline platform team stakeholders customers "
+    "revenue latency cost quality reporting migration architecture mentoring roadmap strategy"
+).split()
+SECTIONS = ["Summary", "Experience", "Education", "Skills", "Projects", "Certifications"]
+
+
+def cv_lines(pages, lines_per_page=55, seed=0):
+    """Returns the lines of a synthetic CV, lines_per_page lines for each page."""
+    rng = random.Random(seed)
+    lines = []
+    for page in range(pages):
+        lines.append(f"{SECTIONS[page % len(SECTIONS)]}")
+        lines.append(f"Senior Engineer, Example Corp {page + 1}, 20{10 + page % 10} - 20{11 + page % 10}")
+        for _ in range(lines_per_page - 2):
+            words = rng.sample(WORDS, 10)
+            lines.append(f"- {words[0].capitalize()} {' '.join(words[1:])} by {rng.randint(5, 60)}%")
+    return lines
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages, lines_per_page=55, image_size=0, seed=0):
+    """Writes a CV of the given number of pages to path.
+
+    image_size > 0 adds a noisy image_size x image_size RGB image to every page, for
+    image-heavy PDFs where the parser spends its time skipping image data.
+    """
+    lines = cv_lines(pages, lines_per_page, seed)
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    image = None
+    if image_size:
+        pixels = zlib.compress(random.Random(seed).randbytes(image_size * image_size * 3), 1)
+        image = add(
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB "
+            b"/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n" % (image_size, image_size, len(pixels))
+            + pixels + b"\nendstream"
+        )
+    pages_id = len(objects) + 2 * pages + 1
+    page_ids = []
+    for page in range(pages):
+        text = " ".join(f"({_escape(line)}) '" for line in lines[page * lines_per_page:(page + 1) * lines_per_page])
+        content = f"BT /F1 9 Tf 40 800 Td 13 TL {text} ET"
+        resources = f"/Font << /F1 {font} 0 R >>"
+        if image:
+            content += " q 200 0 0 200 380 600 cm /Im1 Do Q"
+            resources += f" /XObject << /Im1 {image} 0 R >>"
+        data = content.encode("latin-1")
+        contents = add(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        page_ids.append(add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << {resources} >> /Contents {contents} 0 R >>".encode()
+        ))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    add(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    catalog = add(f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode())
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def write_secrets(directory, secrets):
+    """Writes secrets to directory/.streamlit/secrets.toml, where backend reads its settings when run from directory."""
+    os.makedirs(os.path.join(directory, ".streamlit"), exist_ok=True)
+    with open(os.path.join(directory, ".streamlit", "secrets.toml"), "w") as f:
+        # JSON strings, numbers and booleans are also valid TOML values
+        f.write("".join(f"{key} = {json.dumps(value)}\n" for key, value in secrets.items()))
+
+
+def fixture_set(directory, sizes=(1, 3, 10), image_size=0):
+    """Writes one CV per page count in sizes to directory and returns their paths."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for pages in sizes:
+        path = os.path.join(directory, f"cv_{pages}p{'_images' if image_size else ''}.pdf")
+        write_pdf(path, pages, image_size=image_size, seed=pages)
+        paths.append(path)
+    return paths
@@ -0,0 +1,138 @@
+"""End-to-end benchmark of the Evaluate pipeline against a local stub LLM, with no network or API key.
+
+    python benchmarks/pipeline.py [--concurrency 1 4 16] [--evaluations 20] [--latency 0.2]
+                                  [--tokens-per-second 400] [--latency-sigma 0] [--rate-limit-every 0]
+                                  [--error-rate 0] [--seed 0] [--max-p95 SECONDS]
+
+Each evaluation extracts a synthetic PDF (1, 3 or 10 pages), runs the five dimensions and
+summary through evaluate_all, and scores them with extract_score, exactly like the Evaluate
+button. backend.llm is replaced by stub_llm.StubChatModel and the response cache is disabled, so
+every run measures the pipeline itself. --rate-limit-every and --error-rate inject rate limits
+and provider failures (HTTP 503), so the retry and error paths can be measured too; --seed makes
+the failures and --latency-sigma's slow calls repeatable. The report gives p50/p95 latency, evaluations per second
+and the process's peak resident memory for each concurrency level. With --max-p95 the script exits with status 1 when the
+p95 latency of any concurrency level exceeds the limit, for use in CI.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fixtures import fixture_set, write_secrets
+
+JOB_DESCRIPTION = (
+    "Senior Data Engineer. Design and operate batch and streaming pipelines in Python, SQL, Spark and "
+    "Airflow on AWS. Model data for analytics, mentor engineers and work closely with stakeholders."
+)
+# Roughly the length of one real dimension analysis
+STUB_RESPONSE = " ".join(["1. The section headers are consistent and the bullets are concise."] * 40) + " Score: 68/100"
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def evaluate_once(path):
+    """Runs the Evaluate pipeline on the PDF at path and returns (seconds, failed prompts)."""
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        cv_content = pdf_extract.extract_text(f.read()).text
+    results, errors = backend.evaluate_all(cv_content, JOB_DESCRIPTION)
+    for name in backend.DIMENSIONS:
+        if name in results:
+            backend.extract_score(results[name])
+    return time.perf_counter() - start, len(errors)
+
+
+def run_level(paths, concurrency, evaluations):
+    """Runs evaluations evaluations, concurrency at a time, and returns their statistics."""
+    pdf_extract.clear_cache()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(evaluate_once, (paths[i % len(paths)] for i in range(evaluations))))
+    wall = time.perf_counter() - start
+    latencies = [seconds for seconds, _ in outcomes]
+    return {
+        "concurrency": concurrency,
+        "evaluations": evaluations,
+        "p50": statistics.median(latencies),
+        "p95": percentile(latencies, 0.95),
+        "evaluations_per_second": evaluations / wall,
+        "failed_prompts": sum(failed for _, failed in outcomes),
+        # High-water mark of the whole process so far (kilobytes on Linux), so it only ever grows
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="evaluations run at the same time")
+    parser.add_argument("--evaluations", type=int, default=20, help="evaluations per concurrency level")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=400, help="stub output speed (0 for instant)")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="make every Nth stub call hit the rate limit")
+    parser.add_argument("--rate-limit-wait", type=float, default=0.5, help="wait, in seconds, the rate limit message asks for")
+    parser.add_argument("--latency-sigma", type=float, default=0.0, help="spread of the log-normal stub latency (0 for fixed)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub calls that fail with a provider error")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the stub's random failures and latencies")
+    parser.add_argument("--max-p95", type=float, default=None, help="fail if any p95 latency is above this many seconds")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    global backend, pdf_extract
+    with tempfile.TemporaryDirectory() as directory:
+        # Give backend a dummy key and keep its cache file inside the temporary directory
+        write_secrets(directory, {"Groq_API_Key": "offline-benchmark", "LLM_Cache_Enabled": False, "Metrics_Log": False})
+        os.chdir(directory)
+
+        import backend
+        import pdf_extract
+        from scheduler import RequestScheduler
+        from stub_llm import StubChatModel
+
+        backend.llm = StubChatModel(
+            response=STUB_RESPONSE,
+            latency=args.latency,
+            tokens_per_second=args.tokens_per_second,
+            rate_limit_every=args.rate_limit_every,
+            rate_limit_wait=f"{args.rate_limit_wait}s",
+            latency_sigma=args.latency_sigma,
+            error_rate=args.error_rate,
+            seed=args.seed,
+        )
+        backend.scheduler = RequestScheduler(
+            requests_per_minute=10 ** 6,
+            max_concurrency=7 * max(args.concurrency),
+            base_delay=0.05,
+        )
+        paths = fixture_set(os.path.join(directory, "cvs"), sizes=(1, 3, 10))
+
+        # Warm up imports and caches so the first level is not charged for them
+        evaluate_once(paths[0])
+        report = [run_level(paths, concurrency, args.evaluations) for concurrency in args.concurrency]
+
+    print(f"stub: {args.latency}s latency (sigma {args.latency_sigma:g}), {args.tokens_per_second:g} tokens/s, "
+          f"rate limit every {args.rate_limit_every or '-'} calls, {args.error_rate:.0%} errors")
+    print(f"{'concurrency':>11} {'p50 s':>8} {'p95 s':>8} {'evals/s':>8} {'failed':>7} {'peak RSS MB':>12}")
+    for level in report:
+        print(f"{level['concurrency']:>11} {level['p50']:>8.2f} {level['p95']:>8.2f} {level['evaluations_per_second']:>8.2f} "
+              f"{level['failed_prompts']:>7} {level['peak_rss_mb']:>12.1f}")
+    if args.json:
+        with open(os.path.join(ROOT, args.json) if not os.path.isabs(args.json) else args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.max_p95 is not None and any(level["p95"] > args.max_p95 for level in report):
+        print(f"p95 latency is above the {args.max_p95}s limit", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Counts the input tokens one evaluation sends to the LLM, per prompt and in total, and those of a new draft.
+
+Run from the repository root (needs .streamlit/secrets.toml like the app):
+
+    python benchmarks/prompt_tokens.py [--pages 3]
+
+Tokens are estimated at 4 characters each, the same rule the scheduler uses for its quota. The
+draft is only written when the user asks for it, so it is reported apart from the evaluation; its
+suggestion inputs are the condensed reports (backend.condense_report), as in the app.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.prompts import ChatPromptTemplate
+
+import backend
+
+BULLET = "- Developed and maintained data pipelines in Python and SQL, reducing report latency by 35% for 12 teams."
+JOB_DESCRIPTION = (
+    "We are hiring a Senior Data Engineer to design, build and operate batch and streaming pipelines. "
+    "Required: Python, SQL, Spark, Airflow, AWS, data modelling, stakeholder communication. "
+    "Nice to have: Kafka, dbt, Terraform, mentoring experience. "
+) * 3
+# A typical report returned by one dimension: the summary reads it whole, draft_new its condensed form
+REPORT = (
+    "1. Overall analysis: " + "The CV is consistent but dense, and several bullets describe duties. " * 12
+    + "\n2. Strengths: " + "Clear job titles and dates. " * 6
+    + "\n3. Suggestions for Improvement: " + "Quantify results and lead each bullet with an action verb. " * 8
+    + "\n4. Score: 65/100"
+)
+
+
+def synthetic_cv(pages):
+    lines = []
+    for page in range(pages):
+        lines.append(f"Experience {page + 1}\nData Engineer, Example Corp, 2018 - 2021")
+        lines.extend([BULLET] * 25)
+    return "\n".join(lines)
+
+
+def count_tokens(template, inputs):
+    text = "".join(message.content for message in ChatPromptTemplate.from_template(template).format_messages(**inputs))
+    return len(text) // 4
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=3, help="length of the synthetic CV in pages")
+    args = parser.parse_args()
+
+    cv_inputs = backend._document_inputs(synthetic_cv(args.pages), JOB_DESCRIPTION)
+    reports = {f"suggest{i}": REPORT for i in range(1, 6)}
+    condensed = {f"suggest{i}": backend.condense_report(REPORT) for i in range(1, 6)}
+    separate = {
+        "struct": count_tokens(backend.assemble_prompt(backend.STRUCT_INSTRUCTIONS, "cv_content", "local_findings"), cv_inputs),
+        "verb": count_tokens(backend.assemble_prompt(backend.VERB_INSTRUCTIONS, "cv_content", "job_description", "local_findings"), cv_inputs),
+        "content": count_tokens(backend.assemble_prompt(backend.CONTENT_INSTRUCTIONS, "cv_content", "job_description", "local_findings"), cv_inputs),
+        "ats": count_tokens(backend.assemble_prompt(backend.ATS_INSTRUCTIONS, "cv_content", "job_description", "local_findings"), cv_inputs),
+        "role": count_tokens(backend.assemble_prompt(backend.ROLE_INSTRUCTIONS, "cv_content", "job_description", "local_findings"), cv_inputs),
+    }
+    single = count_tokens(backend._all_dimensions_template(), cv_inputs)
+    summary = count_tokens(backend.SUMMARY_TEMPLATE, reports)
+    draft = count_tokens(backend.DRAFT_TEMPLATE, {**cv_inputs, **condensed})
+
+    print(f"CV: {len(cv_inputs['cv_content']) // 4} tokens, job description: {len(JOB_DESCRIPTION) // 4} tokens")
+    for name, tokens in separate.items():
+        print(f"  {name:<8} {tokens:>7}")
+    print(f"  {'all':<8} {single:>7}  (single call)")
+    print(f"  {'summary':<8} {summary:>7}")
+    print(f"Per evaluation, separate calls: {sum(separate.values()) + summary}")
+    print(f"Per evaluation, single call:    {single + summary}")
+    print(f"New draft, when asked for:      {draft}  (condensed suggestions)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Compares routing policies on local stub providers with long-tailed latency and injected outages.
+
+    python benchmarks/routing.py [--calls 200] [--concurrency 8] [--latency 0.3] [--sigma 1.0]
+                                 [--hedge-after 0.6] [--error-rate 0.3] [--seed 0]
+
+Every scenario sends the same calls, named after the five dimensions, through backend._run_chain
+with a Router built by router.build_provider from "stub" provider settings, exactly as the
+Providers and Routing secrets would build it. Latencies are log-normal with median --latency and
+shape --sigma. The report gives p50/p95/p99 call latency, failed calls, hedged requests,
+failovers and the share of calls each provider answered. The response cache is disabled.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import write_secrets
+
+NAMES = ["struct", "verb", "content", "ats", "role"]
+TEMPLATE = "<cv>\n{cv_content}\n</cv>\nEvaluate the CV in the <cv> block. Call {number}."
+RESPONSE = "1. The structure is clear.\n3. Suggestions for Improvement: quantify results.\n4. Score: 70/100"
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def scenarios(args):
+    """Returns (title, providers settings, Router arguments) for each policy compared."""
+    stub = {"kind": "stub", "response": RESPONSE, "requests_per_minute": 10 ** 6, "max_concurrency": 10 ** 3}
+    primary = {**stub, "model_name": "stub-large", "latency": args.latency, "latency_sigma": args.sigma, "seed": args.seed}
+    backup = {**primary, "model_name": "stub-backup", "seed": args.seed + 1}
+    fast = {**primary, "model_name": "stub-small", "latency": args.latency / 3, "seed": args.seed + 2}
+    failing = {**primary, "error_rate": args.error_rate}
+    return [
+        ("one provider", {"primary": primary}, {"default": ["primary"]}),
+        (f"hedge after {args.hedge_after:g}s", {"primary": primary, "backup": backup},
+         {"default": ["primary", "backup"], "hedge_after": args.hedge_after}),
+        ("struct, verb on a smaller model", {"primary": primary, "fast": fast},
+         {"default": ["primary"], "routes": {"struct": ["fast", "primary"], "verb": ["fast", "primary"]}}),
+        (f"{args.error_rate:.0%} errors, no fallback", {"primary": failing}, {"default": ["primary"]}),
+        (f"{args.error_rate:.0%} errors, failover", {"primary": failing, "backup": backup},
+         {"default": ["primary", "backup"], "failure_threshold": 10 ** 6}),
+    ]
+
+
+def run_scenario(backend, router, providers, calls, concurrency):
+    from scheduler import LLMError
+
+    def one_call(number):
+        start = time.perf_counter()
+        try:
+            backend._run_chain(TEMPLATE, {"cv_content": "Jane Doe", "number": number}, name=NAMES[number % len(NAMES)])
+        except LLMError:
+            return time.perf_counter() - start, False
+        return time.perf_counter() - start, True
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one_call, range(calls)))
+    latencies = [seconds for seconds, ok in outcomes if ok]
+    answered = Counter()
+    for provider in providers.values():
+        answered[provider.name] = provider.llm.calls
+    return {
+        "p50": statistics.median(latencies) if latencies else float("nan"),
+        "p95": percentile(latencies, 0.95) if latencies else float("nan"),
+        "p99": percentile(latencies, 0.99) if latencies else float("nan"),
+        "failed": sum(not ok for _, ok in outcomes),
+        "hedges": router.hedges,
+        "failovers": router.failovers,
+        "requests": dict(answered),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200, help="calls per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="calls in flight at once")
+    parser.add_argument("--latency", type=float, default=0.3, help="median stub latency in seconds")
+    parser.add_argument("--sigma", type=float, default=1.0, help="log-normal shape of the stub latency (0 for fixed)")
+    parser.add_argument("--hedge-after", type=float, default=0.6, help="seconds before a slow call is hedged")
+    parser.add_argument("--error-rate", type=float, default=0.3, help="share of calls the failing provider rejects")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the stub latency and error draws")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_secrets(directory, {"LLM_Cache_Enabled": False, "Metrics_Log": False})
+        os.chdir(directory)
+
+        import backend
+        from router import Router, build_provider
+
+        print(f"{args.calls} calls, {args.concurrency} at a time; stub latency median {args.latency}s, sigma {args.sigma}")
+        print(f"{'scenario':<34} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'failed':>7} {'hedges':>7} {'failovers':>9}  requests")
+        for title, settings, policy in scenarios(args):
+            providers = {name: build_provider(name, values) for name, values in settings.items()}
+            backend.router = Router(providers, **policy)
+            result = run_scenario(backend, backend.router, providers, args.calls, args.concurrency)
+            requests = ", ".join(f"{name} {count}" for name, count in result["requests"].items())
+            print(f"{title:<34} {result['p50']:>7.2f} {result['p95']:>7.2f} {result['p99']:>7.2f} {result['failed']:>7} "
+                  f"{result['hedges']:>7} {result['failovers']:>9}  {requests}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Measures the shortlist index: build, save and load time, and query latency over many CVs.
+
+    python benchmarks/shortlist.py [--cvs 10000] [--words 600] [--queries 200] [--top-k 20] [--seed 0]
+
+CV texts are synthetic: a few thousand-word vocabulary drawn with Zipf-like frequencies (so
+common words appear in most CVs and rare ones in few), split into sections and bullet lines
+like extracted CV text, plus a handful of skills per CV. Job descriptions mix skills with
+common words. Query latency (rank() of the top K) is reported as p50/p95/p99 for the CVs still
+pending after add(), after merge(), and memory-mapped after a reload from disk, then for
+add() and remove() on the loaded index.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shortlist import ShortlistIndex
+
+SKILLS = ("python sql spark airflow kafka aws azure gcp kubernetes docker terraform java scala go rust react "
+          "typescript django flask pandas numpy pytorch tensorflow tableau excel salesforce sap figma").split()
+SECTIONS = ["Summary", "Experience", "Education", "Skills", "Projects"]
+
+
+def vocabulary(size, rng):
+    """Returns size made-up words of 4 to 9 letters."""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choices(letters, k=rng.randint(4, 9))) for _ in range(size)]
+
+
+def synthetic_cv(words, weights, word_count, rng):
+    skills = rng.sample(SKILLS, 6)
+    lines = []
+    drawn = rng.choices(words, weights, k=word_count)
+    for start in range(0, word_count, 12):
+        if start % 120 == 0:
+            lines.append(SECTIONS[start // 120 % len(SECTIONS)])
+        lines.append("- " + " ".join(drawn[start:start + 12] + [rng.choice(skills)]))
+    return "\n".join(lines)
+
+
+def synthetic_job_description(words, weights, rng):
+    return " ".join(rng.sample(SKILLS, 5) + rng.choices(words, weights, k=60))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def time_queries(index, job_descriptions, top_k):
+    latencies = []
+    for job_description in job_descriptions:
+        start = time.perf_counter()
+        index.rank(job_description, top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(title, latencies):
+    print(f"  {title:<36} p50 {statistics.median(latencies):7.2f} ms   p95 {percentile(latencies, 0.95):7.2f} ms   "
+          f"p99 {percentile(latencies, 0.99):7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cvs", type=int, default=10000, help="CVs in the index")
+    parser.add_argument("--words", type=int, default=600, help="words per CV (about two pages)")
+    parser.add_argument("--queries", type=int, default=200, help="job descriptions ranked per measurement")
+    parser.add_argument("--top-k", type=int, default=20, help="CVs returned per query")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = vocabulary(5000, rng)
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    print(f"{args.cvs} synthetic CVs of {args.words} words, {args.queries} job descriptions, top {args.top_k}")
+    texts = [synthetic_cv(words, weights, args.words, rng) for _ in range(args.cvs)]
+    job_descriptions = [synthetic_job_description(words, weights, rng) for _ in range(args.queries)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = ShortlistIndex(directory)
+        start = time.perf_counter()
+        for number, text in enumerate(texts):
+            index.add(f"cv-{number}", text)
+        print(f"  add() of every CV: {time.perf_counter() - start:.2f}s "
+              f"({(time.perf_counter() - start) / args.cvs * 1000:.2f} ms per CV)")
+        report("rank(), CVs pending", time_queries(index, job_descriptions, args.top_k))
+
+        start = time.perf_counter()
+        index.save()
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"  save() (merge and write): {time.perf_counter() - start:.2f}s, {size / 2 ** 20:.1f} MiB on disk, "
+              f"{len(index._postings['features'])} postings")
+        report("rank(), merged", time_queries(index, job_descriptions, args.top_k))
+
+        start = time.perf_counter()
+        loaded = ShortlistIndex(directory)
+        print(f"  load (memory-mapped): {(time.perf_counter() - start) * 1000:.1f} ms")
+        report("rank(), memory-mapped after load", time_queries(loaded, job_descriptions, args.top_k))
+
+        changes = [(f"cv-{number}", texts[number]) for number in rng.sample(range(args.cvs), min(100, args.cvs))]
+        add_times = []
+        remove_times = []
+        for key, text in changes:
+            start = time.perf_counter()
+            loaded.remove(key)
+            remove_times.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            loaded.add(key, text)
+            add_times.append((time.perf_counter() - start) * 1000)
+        print(f"  remove() p50 {statistics.median(remove_times):.2f} ms, add() p50 {statistics.median(add_times):.2f} ms "
+              f"on the loaded index")
+        report(f"rank(), {len(changes)} CVs replaced", time_queries(loaded, job_descriptions, args.top_k))
+
+
+if __name__ == "__main__":
+    main()
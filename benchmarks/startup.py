@@ -0,0 +1,100 @@
+"""Measures the cold start of the app: import time of backend and the first render of frontend.py.
+
+    python benchmarks/startup.py [--runs 5] [--top 10] [--max-first-render SECONDS]
+
+Every run starts a fresh interpreter, as a new container would. The import of backend is timed
+with python -X importtime, and the report lists the modules that take the longest. The first
+render runs frontend.py once with streamlit.testing.v1.AppTest, without pressing Evaluate, and
+is timed from interpreter start. With --max-first-render the script exits with status 1 when
+the median first render exceeds the limit, for use in CI.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from fixtures import write_secrets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Settings for the first render: no LLM call is made, so the key is never used
+SECRETS = {"Groq_API_Key": "offline-benchmark", "LLM_Cache_Enabled": False, "Metrics_Log": False}
+
+FIRST_RENDER = f"""
+import time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("frontend.py", default_timeout=120)
+app.secrets.update({SECRETS!r})
+app.run()
+if app.exception:
+    raise SystemExit(str(app.exception))
+print(time.perf_counter() - start)
+"""
+
+
+def run_python(args, cwd):
+    """Runs a fresh interpreter with the repository on its path and returns (wall seconds, stdout, stderr)."""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise SystemExit(f"{' '.join(args)} failed:\n{result.stderr[-2000:]}")
+    return wall, result.stdout, result.stderr
+
+
+def parse_importtime(stderr, depth=1):
+    """Returns {module: cumulative seconds} for the imports at most depth levels below the statement."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented two spaces per level under the module that imported them
+        if (len(name) - len(name.lstrip()) - 1) // 2 <= depth:
+            modules[name.strip()] = int(cumulative) / 1e6
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--max-first-render", type=float, default=None, help="fail if the median first render takes longer")
+    args = parser.parse_args()
+
+    import_walls = []
+    module_times = defaultdict(list)
+    render_walls = []
+    with tempfile.TemporaryDirectory() as directory:
+        write_secrets(directory, SECRETS)
+        for _ in range(args.runs):
+            wall, _, stderr = run_python(["-X", "importtime", "-c", "import backend"], directory)
+            import_walls.append(wall)
+            for module, seconds in parse_importtime(stderr).items():
+                module_times[module].append(seconds)
+            # frontend.py loads static/logo.png relative to the working directory
+            _, stdout, _ = run_python(["-c", FIRST_RENDER], ROOT)
+            render_walls.append(float(stdout.strip().splitlines()[-1]))
+
+    first_render = statistics.median(render_walls)
+    print(f"median of {args.runs} fresh interpreters")
+    print(f"  python -c 'import backend': {statistics.median(import_walls):.2f}s wall, "
+          f"{statistics.median(module_times['backend']):.2f}s importing backend")
+    print(f"  first render of frontend.py (streamlit import + script run): {first_render:.2f}s")
+    print("slowest imports under import backend:")
+    slowest = sorted(module_times, key=lambda module: statistics.median(module_times[module]), reverse=True)
+    for module in slowest[:args.top]:
+        print(f"  {statistics.median(module_times[module]):>6.3f}s  {module}")
+    if args.max_first_render is not None and first_render > args.max_first_render:
+        print(f"the first render is above the {args.max_first_render}s limit", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
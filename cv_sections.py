@@ -0,0 +1,124 @@
+import re
+from typing import NamedTuple
+
+# Sections under this many tokens are joined to the next one rather than reviewed on their own
+MIN_CHUNK_TOKENS = 250
+
+# Heading lines (lower-cased, "&" written as "and", punctuation removed) and the section each one starts
+SECTION_HEADINGS = {
+    **dict.fromkeys(["summary", "professional summary", "profile", "personal profile", "professional profile",
+                     "objective", "career objective", "about me"], "Summary"),
+    **dict.fromkeys(["contact", "contact information", "contact details", "personal details",
+                     "personal information"], "Contact"),
+    **dict.fromkeys(["experience", "work experience", "professional experience", "relevant experience",
+                     "employment", "employment history", "work history", "career history"], "Experience"),
+    **dict.fromkeys(["education", "education and training", "academic background", "qualifications",
+                     "academic qualifications"], "Education"),
+    **dict.fromkeys(["skills", "technical skills", "core skills", "key skills", "skills and abilities",
+                     "competencies", "core competencies", "technologies"], "Skills"),
+    **dict.fromkeys(["projects", "selected projects", "personal projects", "key projects"], "Projects"),
+    **dict.fromkeys(["certifications", "certificates", "licenses and certifications", "licences and certifications",
+                     "courses", "training"], "Certifications"),
+    **dict.fromkeys(["publications", "selected publications", "papers", "books"], "Publications"),
+    **dict.fromkeys(["research", "research experience", "research interests"], "Research"),
+    **dict.fromkeys(["teaching", "teaching experience"], "Teaching"),
+    **dict.fromkeys(["grants", "funding", "grants and funding", "grants and awards"], "Grants"),
+    **dict.fromkeys(["presentations", "talks", "conferences", "invited talks",
+                     "conference presentations"], "Presentations"),
+    **dict.fromkeys(["awards", "honors", "honours", "awards and honors", "awards and honours",
+                     "achievements"], "Awards"),
+    **dict.fromkeys(["leadership", "leadership experience", "activities", "extracurricular activities"], "Leadership"),
+    **dict.fromkeys(["volunteering", "volunteer experience", "volunteer work"], "Volunteering"),
+    **dict.fromkeys(["languages"], "Languages"),
+    **dict.fromkeys(["interests", "hobbies", "hobbies and interests"], "Interests"),
+    **dict.fromkeys(["references", "referees"], "References"),
+}
+
+
+class Section(NamedTuple):
+    name: str
+    text: str
+
+
+def estimate_tokens(text):
+    """Roughly estimates the tokens in text, at about 4 characters per token."""
+    return len(text) // 4
+
+
+def section_heading(line):
+    """Returns the section a heading line starts, or None if the line is not a heading."""
+    if len(line.strip()) > 50:
+        return None
+    normalized = re.sub(r"[^a-z ]", "", line.lower().replace("&", " and "))
+    return SECTION_HEADINGS.get(" ".join(normalized.split()))
+
+
+def split_sections(text):
+    """Splits CV text into its sections, in order, at the heading lines.
+
+    Text before the first heading (usually the name and contact details) is the "Header" section.
+    Sections with no text besides their heading are dropped.
+    """
+    sections = []
+    name = "Header"
+    lines = []
+    for line in text.splitlines():
+        heading = section_heading(line)
+        if heading is not None:
+            sections.append(Section(name, "\n".join(lines)))
+            name = heading
+            lines = []
+        lines.append(line)
+    sections.append(Section(name, "\n".join(lines)))
+    return [section for section in sections if len(section.text.strip().splitlines()) > (section.name != "Header")]
+
+
+def _split_long(section, max_tokens):
+    """Cuts a section over max_tokens tokens into parts at line breaks."""
+    if estimate_tokens(section.text) <= max_tokens:
+        return [section]
+    max_chars = max_tokens * 4
+    parts = [[]]
+    chars = 0
+    for line in section.text.splitlines():
+        # A single line longer than the budget is cut where it overflows
+        for start in range(0, max(1, len(line)), max_chars):
+            piece = line[start:start + max_chars]
+            if parts[-1] and chars + len(piece) + 1 > max_chars:
+                parts.append([])
+                chars = 0
+            parts[-1].append(piece)
+            chars += len(piece) + 1
+    return [Section(f"{section.name} (part {number} of {len(parts)})", "\n".join(lines))
+            for number, lines in enumerate(parts, 1)]
+
+
+def chunk_sections(sections, max_tokens, min_tokens=MIN_CHUNK_TOKENS):
+    """Groups sections into chunks of at most max_tokens tokens and returns them as Sections.
+
+    Each section of min_tokens or more gets a chunk of its own, so editing one section leaves the
+    chunks of the others, and the reviews cached for them, unchanged. Sections under min_tokens
+    are joined to the next section, whatever its size, and sections over max_tokens are cut at
+    line breaks. Whether a chunk ends after a section depends only on that section's own length,
+    so no edit moves the boundaries of chunks further on.
+    """
+    chunks = []
+    pending = []
+
+    def pending_tokens():
+        return sum(estimate_tokens(part.text) for part in pending)
+
+    def flush():
+        if pending:
+            chunks.append(Section(", ".join(part.name for part in pending), "\n".join(part.text for part in pending)))
+            pending.clear()
+
+    for section in sections:
+        for part in _split_long(section, max_tokens):
+            if pending and pending_tokens() + estimate_tokens(part.text) > max_tokens:
+                flush()
+            pending.append(part)
+            if estimate_tokens(part.text) >= min_tokens:
+                flush()
+    flush()
+    return chunks
@@ -1,133 +1,333 @@
 import streamlit as st
-import PyPDF2
-from backend import CVstruct_prompt, actVerb_prompt, CVcontent_prompt, ATS_prompt, jobRole_prompt, draft_new, summary
-from PIL import Image
+from backend import stream_evaluation, extract_score, overall_score, DIMENSIONS, DraftJob, condense_report, format_quick_result, LLMError
+from pdf_extract import MAX_CHARS, extract_text
+from local_analysis import analyze, provisional_scores
+from metrics import start_http_server, start_trace
+from service import remote_evaluation
+import sys
 import time
-import re
-import pandas as pd
 
 # Set page config as the first Streamlit command
 st.set_page_config(page_title="CV Evaluator", page_icon="📄")
 
+DIMENSION_LABELS = {
+    "struct": "Structure & Formatting",
+    "verb": "Action Verbs",
+    "content": "Content Quality",
+    "ats": "ATS Compatibility",
+    "role": "Job Role Match",
+}
+
+TAB_TITLES = ["Summary", "Structure & Formatting", "Action Verbs Usage", "Content Quality", "ATS Compatibility", "Job Role Match", "New Draft CV"]
+# With Service_URL set, evaluations run on the workers of the evaluation service (service.py) instead of in this app
+SERVICE_URL = st.secrets.get("Service_URL")
+SERVICE_TOKEN = st.secrets.get("Service_Token")
+
+SUBHEADERS = {
+    "struct": "1. Structure and Formatting",
+    "verb": "2. Action Verbs Usage",
+    "content": "3. Content Quality",
+    "ats": "4. ATS Compatibility",
+    "role": "5. Job Role Match",
+}
+
+
+def get_score_color(score):
+      if score >= 75:
+          return "green"
+      elif score >= 60:
+          return "orange"
+      else:
+          return "red"
+
+
+def evaluation_events(cv_content, job_description, quick=False):
+    """Yields the (name, kind, result) events of an evaluation, run here or on the evaluation service."""
+    if SERVICE_URL:
+        return remote_evaluation(SERVICE_URL, cv_content, job_description, quick=quick, token=SERVICE_TOKEN)
+    return stream_evaluation(cv_content, job_description, quick=quick)
+
+
+@st.cache_resource
+def load_logo():
+    """Reads the logo once per process instead of on every rerun."""
+    with open("static/logo.png", "rb") as f:
+        return f.read()
+
+
+@st.cache_resource
+def serve_metrics(port):
+    """Serves the Prometheus metrics on port once per process, or does nothing if another process holds it."""
+    try:
+        return start_http_server(port)
+    except OSError as e:
+        print(f"Not serving metrics on port {port}: {e}", file=sys.stderr)
+
+
+if st.secrets.get("Metrics_Port"):
+    serve_metrics(int(st.secrets["Metrics_Port"]))
+
+
+def show_overall_score(score):
+    st.title('CV Evaluation Scores')
+    st.subheader("Overal Score")
+    color = get_score_color(score)
+    st.markdown(f"<span style='color:{color}'>{score}</span>", unsafe_allow_html=True)
+    if score >= 85:
+        st.write("🟢")
+    elif score >= 60:
+        st.write("🟠")
+    elif score < 60:
+        st.write("🔴")
+    else:
+        st.write("❌")
+
+
+def stream_into(placeholder, run):
+    """Calls run(on_token) in the script thread, redrawing placeholder as text streams in, and returns the text."""
+    parts = []
+    last_drawn = 0.0
+
+    def on_token(text):
+        nonlocal last_drawn
+        parts.append(text)
+        if time.monotonic() - last_drawn > 0.1:
+            placeholder.markdown("".join(parts) + " ▌")
+            last_drawn = time.monotonic()
+
+    try:
+        text = run(on_token)
+    except LLMError as e:
+        placeholder.error(str(e))
+        return None
+    placeholder.write(text)
+    return text
+
+
+def draft_suggestions(evaluation):
+    """Returns the condensed suggestions of the five dimensions that the new draft is written from."""
+    if evaluation["quick"]:
+        return [format_quick_result({"score": evaluation["scores"][name], "findings": evaluation["findings"][name]}) for name in DIMENSIONS]
+    return [condense_report(evaluation["reports"][name]) for name in DIMENSIONS]
+
+
+def show_draft(evaluation):
+    """Draws the New Draft CV tab; the draft is only written when asked for, in a background DraftJob."""
+    st.subheader("6. New Draft CV Based on Above Suggestions:")
+    placeholder = st.empty()
+    job = evaluation["draft_job"]
+    if len(evaluation["scores"]) < len(DIMENSIONS):
+        placeholder.info("A new draft needs every evaluation to succeed.")
+        return
+    if job is None:
+        if not placeholder.button("Write a new draft", key="draft"):
+            return
+        start_trace()
+        job = evaluation["draft_job"] = DraftJob(evaluation["cv_content"], evaluation["job_description"], draft_suggestions(evaluation))
+    # The job keeps running across reruns; changing the inputs cancels it
+    while not job.wait(0.1):
+        placeholder.markdown(job.text() + " ▌")
+    if job.error is not None:
+        placeholder.error(str(job.error))
+    else:
+        placeholder.write(job.result)
+
+
+def show_results(evaluation):
+    """Draws a finished evaluation from session state, so it survives the reruns its buttons cause."""
+    scores = evaluation["scores"]
+    reports = evaluation["reports"]
+    errors = evaluation["errors"]
+    tabs = st.tabs(TAB_TITLES)
+    with tabs[0]:
+        # A failed evaluation has no score, rather than a score of 0
+        scored = [name for name in DIMENSIONS if name in scores]
+        st.bar_chart({'Labels': [DIMENSION_LABELS[name] for name in scored], 'Scores': [scores[name] for name in scored]}, x = 'Labels', y = 'Scores')
+        if evaluation["quick"]:
+            for name in DIMENSIONS:
+                st.markdown(f"**{DIMENSION_LABELS[name]}**")
+                if name in scores:
+                    st.markdown("\n".join(f"- {finding}" for finding in evaluation["findings"][name]))
+                else:
+                    st.error(errors[name])
+        elif "summary" in reports:
+            st.write(reports["summary"])
+        else:
+            st.error(errors["summary"])
+        if len(scored) < len(DIMENSIONS):
+            st.warning("The overall score is unavailable because some evaluations failed. See their tabs for details.")
+        else:
+            show_overall_score(overall_score(scores))
+        st.caption(f"Trace ID: {evaluation['trace_id']}")
+
+    for tab, name in zip(tabs[1:6], DIMENSIONS):
+        with tab:
+            st.subheader(SUBHEADERS[name])
+            if name in evaluation["findings"]:
+                st.markdown(f"Score: {scores[name]}/100")
+                st.markdown("\n".join(f"- {finding}" for finding in evaluation["findings"][name]))
+            report_placeholder = st.empty()
+            if name in reports:
+                report_placeholder.write(reports[name])
+            elif name in errors:
+                report_placeholder.error(errors[name])
+            elif report_placeholder.button("Load full report", key=f"report_{name}"):
+                start_trace()
+                report = stream_into(report_placeholder, lambda on_token: DIMENSIONS[name](evaluation["cv_content"], evaluation["job_description"], on_token=on_token))
+                if report is not None:
+                    reports[name] = report
+
+    with tabs[6]:
+        show_draft(evaluation)
+
+
+def forget_evaluation():
+    """Drops the evaluation on screen and cancels its draft, if one is being written."""
+    evaluation = st.session_state.pop("evaluation", None)
+    if evaluation is not None and evaluation["draft_job"] is not None:
+        evaluation["draft_job"].cancel()
+
 
 col1, col2 = st.columns([1, 4])
 
-logo = Image.open("static/logo.png")
-col1.image(logo, width=100)  # Adjust width as needed
+col1.image(load_logo(), width=100)  # Adjust width as needed
 col2.title("CV Insight Pro: Your Path to Career Success")
 
 uploaded_file = st.file_uploader("Upload your CV (PDF format, max size: 1 MB)", type="pdf")
 job_description = st.text_area("Enter Job Role Description", height=200)
+quick_mode = st.checkbox("Quick score", help="Scores and key findings only, in a fraction of the time. Full reports load when you ask for them.")
+# An evaluation belongs to the CV and job description it was made for
+inputs_key = (uploaded_file.name, uploaded_file.size, job_description) if uploaded_file is not None else None
+if st.session_state.get("evaluation") is not None and st.session_state["evaluation"]["key"] != inputs_key:
+    forget_evaluation()
 
 
 # Evaluate button
 if st.button("Evaluate"):
+    forget_evaluation()
     if uploaded_file is not None and job_description:
         if uploaded_file.size > 1 * 1024 * 1024:
             st.error("File size exceeds 1 MB limit.")
         else:
+            # One trace ID links the extraction and every LLM call of this evaluation in the logs
+            trace_id = start_trace()
             # Read PDF content
-            pdf_reader = PyPDF2.PdfReader(uploaded_file)
-            cv_content = ""
-            for page in pdf_reader.pages:
-                cv_content += page.extract_text()
+            extracted = extract_text(uploaded_file.getvalue())
+            cv_content = extracted.text
+            if extracted.truncated and len(cv_content) >= MAX_CHARS:
+                st.warning(f"Your CV is longer than {MAX_CHARS:,} characters, so only its first {MAX_CHARS:,} "
+                           f"characters (up to page {extracted.pages}) were evaluated.")
+            elif extracted.truncated:
+                st.warning(f"Only the first {extracted.pages} pages of your CV were evaluated.")
 
-            if cv_content:
-                with st.spinner("Evaluating your CV..."):
-                    progress_bar = st.progress(0)
-                    for i in range(100):
-                        time.sleep(0.2)  # Simulate processing time
-                        progress_bar.progress(i + 1)
+            evaluation = {"key": inputs_key, "cv_content": cv_content, "job_description": job_description,
+                          "trace_id": trace_id, "quick": quick_mode, "scores": {}, "findings": {},
+                          "reports": {}, "errors": {}, "draft_job": None}
+            if cv_content and quick_mode:
+                with st.spinner("Scoring your CV..."):
                     try:
-                        result_struct = CVstruct_prompt(cv_content)
-                        result_verb = actVerb_prompt(cv_content, job_description)
-                        result_content = CVcontent_prompt(cv_content, job_description)
-                        result_ats = ATS_prompt(cv_content, job_description)
-                        result_role = jobRole_prompt(cv_content, job_description)
-                        new_cv = draft_new(cv_content, job_description, result_struct, result_verb, result_content, result_ats, result_role)
-                        summarize = summary(result_struct, result_verb, result_content, result_ats, result_role)
+                        for name, kind, result in evaluation_events(cv_content, job_description, quick=True):
+                            if kind == "result":
+                                evaluation["scores"][name] = result["score"]
+                                evaluation["findings"][name] = result["findings"]
+                            elif kind == "error":
+                                evaluation["errors"][name] = str(result)
+                    except Exception as e:
+                        st.error(f"Evaluation stopped early: {e}")
+                for name in DIMENSIONS:
+                    if name not in evaluation["scores"]:
+                        evaluation["errors"].setdefault(name, f"Error scoring {DIMENSION_LABELS[name]}")
+                st.session_state["evaluation"] = evaluation
+            elif cv_content:
+                # The live view shows the reports as they stream in; show_results replaces it when they are done
+                live_view = st.empty()
+                with live_view.container():
+                    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(TAB_TITLES[:6])
+
+                    # Each result is shown in its own placeholder and redrawn as text streams in
+                    with tab1:
+                        provisional_placeholder = st.empty()
+                        summary_placeholder = st.empty()
+                    with tab2:
+                        st.subheader("1. Structure and Formatting")
+                        struct_placeholder = st.empty()
+                    with tab3:
+                        st.subheader("2. Action Verbs Usage")
+                        verb_placeholder = st.empty()
+                    with tab4:
+                        st.subheader("3. Content Quality")
+                        content_placeholder = st.empty()
+                    with tab5:
+                        st.subheader("4. ATS Compatibility")
+                        ats_placeholder = st.empty()
+                    with tab6:
+                        st.subheader("5. Job Role Match")
+                        role_placeholder = st.empty()
+
+                placeholders = {
+                    "struct": struct_placeholder,
+                    "verb": verb_placeholder,
+                    "content": content_placeholder,
+                    "ats": ats_placeholder,
+                    "role": role_placeholder,
+                    "summary": summary_placeholder,
+                }
+                # Messages for evaluations that never report back
+                fallback_errors = {
+                    "struct": "Error processing structure",
+                    "verb": "Error processing verbs",
+                    "content": "Error processing content",
+                    "ats": "Error processing ATS compatibility",
+                    "role": "Error processing job role match",
+                    "summary": "Error generating summary",
+                }
+                outputs = evaluation["reports"]
+                errors = evaluation["errors"]
+                partial = {name: [] for name in placeholders}
+                last_drawn = {name: 0.0 for name in placeholders}
+
+                # Local checks take milliseconds, so show their rough scores while the LLM works
+                provisional = provisional_scores(analyze(cv_content, job_description))
+                with provisional_placeholder.container():
+                    st.caption("Provisional scores from quick local checks. The full evaluation replaces them when it finishes.")
+                    st.bar_chart({'Labels': [DIMENSION_LABELS[name] for name in provisional], 'Scores': list(provisional.values())}, x = 'Labels', y = 'Scores')
 
+                with st.spinner("Evaluating your CV..."):
+                    progress_bar = st.progress(0, text="Waiting for the first response...")
+                    finished = 0
+                    try:
+                        for name, kind, text in evaluation_events(cv_content, job_description):
+                            if kind == "token":
+                                partial[name].append(text)
+                                # Redrawing a long markdown block is slow, so repaint at most every 0.1 s
+                                if time.monotonic() - last_drawn[name] > 0.1:
+                                    placeholders[name].markdown("".join(partial[name]) + " ▌")
+                                    last_drawn[name] = time.monotonic()
+                            else:
+                                if kind == "result":
+                                    outputs[name] = text
+                                    placeholders[name].write(text)
+                                else:
+                                    # Failed evaluations show their error in place of the analysis
+                                    errors[name] = str(text)
+                                    placeholders[name].error(str(text))
+                                finished += 1
+                                progress_bar.progress(finished / len(placeholders), text=f"Finished {finished} of {len(placeholders)} evaluations")
                     except Exception as e:
-                    
-                        # Assign default values in case of an error
-                        result_struct = "Error processing structure"  
-                        result_verb = "Error processing verbs"
-                        result_content = "Error processing content"
-                        result_ats = "Error processing ATS compatibility"
-                        result_role = "Error processing job role match"
-                        new_cv = "Error generating new CV" 
-                        summarize = "Error generating summary"
-
-                tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(["Summary", "Structure & Formatting", "Action Verbs Usage", "Content Quality", "ATS Compatibility", "Job Role Match", "New Draft CV"])
-
-                
-                def extract_score(result_text):
-                    match = re.findall(r"(\d+)/100", result_text)
-                    if match:
-                        return int(match[-1])
-                    else:
-                        return 0
-
-                struct_score = extract_score(result_struct)
-                verb_score = extract_score(result_verb)
-                content_score = extract_score(result_content)
-                ats_score = extract_score(result_ats)
-                role_score = extract_score(result_role)
-                
-                with tab1:
-                    # Data for the chart
-                    labels = ['Structure & Formatting', 'Action Verbs', 'Content Quality', 'ATS Compatibility', 'Job Role Match']
-                    scores = [struct_score, verb_score, content_score, ats_score, role_score]
-                    weightage = [0.1, 0.1, 0.1, 0.1, 0.6]
-                    data = pd.DataFrame({'Labels': labels, 'Scores': scores, 'Weightage': weightage})
-                    st.bar_chart(data, x = 'Labels', y = 'Scores')
-                    st.write(summarize)
-                    st.title('CV Evaluation Scores')
-                    st.subheader("Overal Score")
-                    score = round((data['Scores'] * data['Weightage']).sum(),2)
-                    
-                    
-                    def get_score_color(score):
-                          if score >= 75:
-                              return "green"
-                          elif score >= 60:
-                              return "orange"
-                          else:
-                              return "red"
-                    color = get_score_color(score)
-                    st.markdown(f"<span style='color:{color}'>{score}</span>", unsafe_allow_html=True)
-                    if score >= 85:
-                        st.write("🟢")
-                    elif score >= 60:
-                        st.write("🟠")
-                    elif score < 60:
-                        st.write("🔴")
-                    else:
-                        st.write("❌")
-
-                
-                with tab2:
-                    st.subheader("1. Structure and Formatting")
-                    st.write(result_struct)
-                with tab3:
-                    st.subheader("2. Action Verbs Usage")
-                    st.write(result_verb)
-                with tab4:
-                    st.subheader("3. Content Quality")
-                    st.write(result_content)
-                with tab5:
-                    st.subheader("4. ATS Compatibility")
-                    st.write(result_ats)
-                with tab6:
-                    st.subheader("5. Job Role Match")
-                    st.write(result_role)
-                with tab7:
-                    st.subheader("6. New Draft CV Based on Above Suggestions:")
-                    st.write(new_cv)
-
-
-
-                
+                        st.error(f"Evaluation stopped early: {e}")
+                    progress_bar.empty()
+                live_view.empty()
+
+                for name in placeholders:
+                    if name not in outputs:
+                        errors.setdefault(name, fallback_errors[name])
+                evaluation["scores"] = {name: extract_score(outputs[name]) for name in DIMENSIONS if name in outputs}
+                st.session_state["evaluation"] = evaluation
+
+# Results stay on screen across reruns, so the buttons in their tabs keep working
+if st.session_state.get("evaluation") is not None:
+    show_results(st.session_state["evaluation"])
+
 
 st.sidebar.title("About")
 st.sidebar.info("""
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def _normalize(text):
+    """Collapses whitespace so that reflowed copies of the same text share a cache key."""
+    return " ".join(str(text).split())
+
+
+def make_key(template, inputs, model, temperature):
+    """Returns the SHA-256 cache key for one prompt call."""
+    payload = json.dumps({
+        "template": template,
+        "inputs": {name: _normalize(value) for name, value in sorted(inputs.items())},
+        "model": model,
+        "temperature": temperature,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier cache of LLM responses: an in-memory LRU in front of a SQLite file.
+
+    The memory tier holds at most memory_entries responses. Both tiers stop serving entries older
+    than max_age seconds, and the disk tier drops them and, once it grows past max_bytes of
+    response text, the least recently used ones. The size of the disk tier is counted once when it
+    is opened and then kept up to date by this process's writes. Hits in the memory tier are written
+    to disk as accesses in batches of touch_batch, and always before the disk tier evicts. Set
+    enabled to False to bypass both tiers.
+    """
+
+    def __init__(self, path, memory_entries=256, max_bytes=50 * 1024 * 1024, max_age=7 * 24 * 3600, enabled=True,
+                 touch_batch=64):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.enabled = enabled
+        self.touch_batch = touch_batch
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._total_bytes = 0
+        self._touched = {}
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT, size INTEGER, created REAL, accessed REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_by_created ON responses (created)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_by_accessed ON responses (accessed)")
+            self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return self._db
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _write_touched(self, db):
+        """Writes the access times of memory-tier hits to disk, so that eviction sees them."""
+        if self._touched:
+            db.executemany("UPDATE responses SET accessed = ? WHERE key = ?",
+                           [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched.clear()
+
+    def get(self, key):
+        """Returns the cached response for key, or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            now = time.time()
+            if key in self._memory:
+                value, created = self._memory[key]
+                if created >= now - self.max_age:
+                    self._memory.move_to_end(key)
+                    self._touched[key] = now
+                    if len(self._touched) >= self.touch_batch:
+                        db = self._connect()
+                        self._write_touched(db)
+                        db.commit()
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+            db = self._connect()
+            row = db.execute(
+                "SELECT value, created FROM responses WHERE key = ? AND created >= ?", (key, now - self.max_age)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            db.commit()
+            self._remember(key, row[0], row[1])
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, value):
+        """Stores a response in both tiers and evicts old entries from disk."""
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.time()
+            self._remember(key, value, now)
+            db = self._connect()
+            size = len(value.encode("utf-8"))
+            self._touched.pop(key, None)
+            self._write_touched(db)
+            replaced = db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, value, size, now, now))
+            self._total_bytes += size - (replaced[0] if replaced else 0)
+            cutoff = now - self.max_age
+            self._total_bytes -= db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses WHERE created < ?", (cutoff,)
+            ).fetchone()[0]
+            db.execute("DELETE FROM responses WHERE created < ?", (cutoff,))
+            if self._total_bytes > self.max_bytes:
+                # Walk from the least recently used entry and drop rows until we are under budget
+                stale = []
+                for old_key, old_size in db.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                    if self._total_bytes <= self.max_bytes:
+                        break
+                    stale.append((old_key,))
+                    self._total_bytes -= old_size
+                db.executemany("DELETE FROM responses WHERE key = ?", stale)
+                for (old_key,) in stale:
+                    self._memory.pop(old_key, None)
+            db.commit()
+
+    def clear(self):
+        """Empties both tiers and resets the counters."""
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            self._connect().execute("DELETE FROM responses")
+            self._db.commit()
+            self._total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns hit/miss counters and the number of responses held in memory."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
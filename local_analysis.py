@@ -0,0 +1,155 @@
+import re
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+WORD_PATTERN = re.compile(r"[a-z][a-z0-9+#.\-]*[a-z0-9+#]|[a-z]")
+BULLET_PATTERN = re.compile(r"^\s*(?:[-•*·▪◦●‣–]|\d+[.)])\s*(.+)$", re.M)
+PHRASE_BREAK_PATTERN = re.compile(r"[,;:()|/\n]|\.\s")
+NUMBER_PATTERN = re.compile(r"\d")
+PRONOUN_PATTERN = re.compile(r"\b(?:I|me|my|mine|myself)\b|\b(?:Me|My|Mine|Myself)\b")
+WEAK_PHRASE_PATTERN = re.compile(r"\b(?:responsible for|duties include[sd]?|tasked with|worked on|helped (?:to )?)\b", re.I)
+
+STOP_WORDS = frozenset("""
+a about above after again all also am an and any are as at be because been being below between both but by
+can could did do does doing down during each etc few for from further had has have having he her here hers
+him his how i if in into is it its itself just let may me more most must my no nor not now of off on once
+only or other our ours out over own per plus same she should so some such than that the their theirs them
+then there these they this those through to too under until up upon us very via was we were what when where
+which while who whom why will with within without would you your yours able across ability strong good
+excellent experience experienced work working team role job candidate candidates year years including
+required requirements preferred knowledge understanding skills skill responsibilities responsible using
+""".split())
+
+ACTION_VERBS = frozenset("""
+accelerated accomplished achieved acquired adapted addressed administered advised advocated analysed analyzed
+architected arranged assembled assessed audited authored automated balanced boosted briefed budgeted built
+calculated captured catalogued chaired championed clarified coached collaborated compiled completed composed
+computed conceived conceptualized conducted configured consolidated constructed consulted contributed
+controlled converted coordinated created cultivated cut debugged decreased defined delegated delivered
+demonstrated deployed designed determined developed devised diagnosed directed discovered drafted drove
+earned edited educated eliminated enabled encouraged engineered enhanced established evaluated exceeded
+executed expanded expedited facilitated finalized forecasted formulated founded generated grew guided
+headed identified implemented improved increased influenced initiated innovated inspected installed
+instituted instructed integrated interviewed introduced invented investigated launched led leveraged
+lowered maintained managed mapped maximized measured mediated mentored merged migrated minimized
+modeled modelled modernized monitored motivated negotiated optimized orchestrated organized originated
+overhauled oversaw partnered performed piloted pioneered planned prepared presented prioritized produced
+programmed promoted proposed prototyped provided published raised rebuilt recommended reconciled recruited
+redesigned reduced refactored refined regulated reorganized replaced reported represented researched
+resolved restructured revamped reviewed revised saved scaled scheduled secured shaped simplified solved
+spearheaded standardized steered streamlined strengthened structured supervised supported surpassed
+synthesized taught tested tracked trained transformed translated troubleshot unified upgraded validated
+verified won wrote
+""".split())
+
+STANDARD_SECTIONS = ("experience", "education", "skills", "contact", "summary", "projects", "certifications")
+
+
+def tokenize(text):
+    """Returns the lower-cased word tokens of text."""
+    return WORD_PATTERN.findall(text.lower())
+
+
+def terms(text):
+    """Returns the content words of text and the pairs of adjacent ones within a phrase, as one array of terms."""
+    words = []
+    pairs = []
+    for phrase in PHRASE_BREAK_PATTERN.split(text):
+        phrase_words = [word for word in tokenize(phrase) if word not in STOP_WORDS and len(word) > 1]
+        words.extend(phrase_words)
+        pairs.extend(f"{first} {second}" for first, second in zip(phrase_words, phrase_words[1:]))
+    return np.array(words + pairs, dtype=object)
+
+
+def tfidf_similarity(cv_terms, job_terms):
+    """Cosine similarity of the TF-IDF vectors of two term arrays, with smoothed IDF over the pair."""
+    if not len(cv_terms) or not len(job_terms):
+        return 0.0
+    vocabulary, inverse = np.unique(np.concatenate([cv_terms, job_terms]), return_inverse=True)
+    counts = np.zeros((2, len(vocabulary)))
+    np.add.at(counts[0], inverse[:len(cv_terms)], 1)
+    np.add.at(counts[1], inverse[len(cv_terms):], 1)
+    document_frequency = (counts > 0).sum(axis=0)
+    weights = counts * (np.log(3 / (1 + document_frequency)) + 1)
+    norms = np.linalg.norm(weights, axis=1)
+    return float(weights[0] @ weights[1] / (norms[0] * norms[1]))
+
+
+def keyword_match(cv_terms, job_terms, limit=25):
+    """Returns the most frequent job description keywords found in, and missing from, the CV."""
+    keywords = [term for term, _ in Counter(job_terms.tolist()).most_common(limit)]
+    present = set(cv_terms.tolist())
+    matched = [term for term in keywords if term in present]
+    missing = [term for term in keywords if term not in present]
+    return matched, missing
+
+
+@lru_cache(maxsize=32)
+def analyze(cv_content, job_description=""):
+    """Runs the deterministic CV checks and returns their findings as a dict.
+
+    Results are cached, so the prompt functions of one evaluation share a single analysis.
+    """
+    bullets = BULLET_PATTERN.findall(cv_content)
+    first_words = [tokenize(bullet)[:1] for bullet in bullets]
+    first_words = [words[0] for words in first_words if words]
+    verb_counts = Counter(word for word in first_words if word in ACTION_VERBS)
+    lower_cv = cv_content.lower()
+
+    findings = {
+        "bullets": len(bullets),
+        "action_verb_share": sum(verb_counts.values()) / len(bullets) if bullets else 0.0,
+        "repeated_verbs": {verb: count for verb, count in verb_counts.most_common() if count > 1},
+        "weak_phrases": len(WEAK_PHRASE_PATTERN.findall(cv_content)),
+        "pronouns": len(PRONOUN_PATTERN.findall(cv_content)),
+        "numbers_share": sum(1 for bullet in bullets if NUMBER_PATTERN.search(bullet)) / len(bullets) if bullets else 0.0,
+        "sections": [section for section in STANDARD_SECTIONS if re.search(rf"^\W*{section}\b", lower_cv, re.M)],
+    }
+    if job_description:
+        cv_terms = terms(cv_content)
+        job_terms = terms(job_description)
+        findings["matched_keywords"], findings["missing_keywords"] = keyword_match(cv_terms, job_terms)
+        findings["keyword_coverage"] = len(findings["matched_keywords"]) / max(
+            1, len(findings["matched_keywords"]) + len(findings["missing_keywords"]))
+        findings["similarity"] = tfidf_similarity(cv_terms, job_terms)
+    return findings
+
+
+def provisional_scores(findings):
+    """Turns the findings into rough 0-100 scores for the dimensions they cover.
+
+    These are stand-ins shown while the LLM evaluation runs, not a replacement for it.
+    """
+    def clamp(value):
+        return int(round(max(0, min(100, value))))
+
+    scores = {
+        "struct": clamp(100 * len(findings["sections"]) / 4),
+        "verb": clamp(100 * findings["action_verb_share"] - min(20, 3 * len(findings["repeated_verbs"]))
+                      - min(20, 5 * findings["weak_phrases"])),
+        "content": clamp(40 + 60 * findings["numbers_share"] - min(20, 5 * findings["pronouns"])
+                         - min(20, 5 * findings["weak_phrases"])),
+    }
+    if "keyword_coverage" in findings:
+        scores["ats"] = clamp(100 * findings["keyword_coverage"])
+        scores["role"] = clamp(100 * (findings["keyword_coverage"] + findings["similarity"]) / 2)
+    return scores
+
+
+def format_findings(findings):
+    """Writes the findings as short lines the prompts can quote instead of recounting."""
+    lines = [
+        f"- Bullet points: {findings['bullets']}",
+        f"- Bullets starting with an action verb: {findings['action_verb_share']:.0%}",
+        f"- Repeated opening verbs: {', '.join(f'{verb} ({count}x)' for verb, count in findings['repeated_verbs'].items()) or 'none'}",
+        f"- Phrases like \"responsible for\" or \"duties include\": {findings['weak_phrases']}",
+        f"- First-person pronouns (I, me, my): {findings['pronouns']}",
+        f"- Bullets containing a number: {findings['numbers_share']:.0%}",
+        f"- Standard section headings found: {', '.join(findings['sections']) or 'none'}",
+    ]
+    if "keyword_coverage" in findings:
+        lines.append(f"- Job description keywords found in the CV: {', '.join(findings['matched_keywords']) or 'none'}")
+        lines.append(f"- Job description keywords missing from the CV: {', '.join(findings['missing_keywords']) or 'none'}")
+    return "\n".join(lines)
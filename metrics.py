@@ -0,0 +1,160 @@
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("resume_checker.metrics")
+
+# Upper bounds, in seconds, of the latency histogram buckets
+BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_histograms = {}
+
+
+def enable_json_logs(stream=None):
+    """Prints every record as one JSON line on stream (stderr by default)."""
+    if any(getattr(handler, "_json_metrics", False) for handler in logger.handlers):
+        return
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    handler._json_metrics = True
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def start_trace(trace_id=None):
+    """Sets the trace ID that links every record of one evaluation and returns it.
+
+    The ID lives in a context variable; copy the context (contextvars.copy_context().run)
+    when handing work to another thread.
+    """
+    trace_id = trace_id or uuid.uuid4().hex
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+def current_trace():
+    """Returns the trace ID of the evaluation running in this context, or None."""
+    return _trace_id.get()
+
+
+def start_thread(target, *args):
+    """Runs target(*args) in a daemon thread, in a copy of the caller's context so it keeps the caller's trace ID."""
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(target, *args), daemon=True)
+    thread.start()
+    return thread
+
+
+def submit(pool, func, *args, **kwargs):
+    """Submits func to an executor in a copy of the caller's context, so it keeps the caller's trace ID."""
+    return pool.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+def _labels(labels):
+    return ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+
+
+def _series(name, labels):
+    return f"{name}{{{labels}}}" if labels else name
+
+
+def _count(name, labels, value=1):
+    _counters[(name, _labels(labels))] += value
+
+
+def _observe(name, labels, seconds):
+    key = (name, _labels(labels))
+    histogram = _histograms.setdefault(key, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+    for index, bound in enumerate(BUCKETS):
+        if seconds <= bound:
+            histogram["buckets"][index] += 1
+    histogram["sum"] += seconds
+    histogram["count"] += 1
+
+
+def record(event, **fields):
+    """Logs one event as a JSON line, tagged with the current trace ID, and updates the aggregates."""
+    fields = {"event": event, "trace_id": current_trace(), "time": time.time(), **fields}
+    logger.info(json.dumps(fields, default=str))
+
+    with _lock:
+        if event == "llm_call":
+            labels = {"name": fields["name"], "status": fields["status"]}
+            if fields.get("provider"):
+                labels["provider"] = fields["provider"]
+            _count("llm_calls_total", labels)
+            _observe("llm_call_seconds", {"name": fields["name"]}, fields["seconds"])
+            if fields.get("first_token_seconds") is not None:
+                _observe("llm_time_to_first_token_seconds", {"name": fields["name"]}, fields["first_token_seconds"])
+            _count("llm_queue_seconds_total", {"name": fields["name"]}, fields.get("queue_seconds") or 0)
+            _count("llm_input_tokens_total", {"name": fields["name"]}, fields.get("input_tokens") or 0)
+            _count("llm_output_tokens_total", {"name": fields["name"]}, fields.get("output_tokens") or 0)
+            _count("llm_retries_total", {"name": fields["name"]}, fields.get("retries") or 0)
+            _count("llm_cache_requests_total", {"result": "hit" if fields.get("cache_hit") else "miss"})
+            if fields.get("rate_limited"):
+                _count("llm_rate_limited_total", {"name": fields["name"]})
+        elif event == "llm_hedge":
+            _count("llm_hedges_total", {"name": fields["name"]})
+        elif event == "llm_failover":
+            _count("llm_failovers_total", {"provider": fields["provider"]})
+        elif event == "extraction":
+            _count("pdf_extractions_total", {"cached": str(bool(fields.get("cached"))).lower()})
+            _observe("pdf_extraction_seconds", {}, fields["seconds"])
+            _count("pdf_extracted_pages_total", {}, fields.get("pages") or 0)
+        elif event == "evaluation":
+            _count("evaluations_total", {"status": fields["status"]})
+            _observe("evaluation_seconds", {}, fields["seconds"])
+
+
+def prometheus_text():
+    """Returns every aggregate in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            lines.append(f"{_series(name, labels)} {value:g}")
+        for (name, labels), histogram in sorted(_histograms.items()):
+            prefix = f"{labels}," if labels else ""
+            for bound, count in zip(BUCKETS, histogram["buckets"]):
+                lines.append(f'{name}_bucket{{{prefix}le="{bound:g}"}} {count}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram["count"]}')
+            lines.append(f"{_series(name + '_sum', labels)} {histogram['sum']:g}")
+            lines.append(f"{_series(name + '_count', labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    """Writes prometheus_text() to path, replacing the file atomically for the node exporter textfile collector."""
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("w", dir=directory, delete=False, suffix=".tmp") as f:
+        f.write(prometheus_text())
+    os.replace(f.name, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serves prometheus_text() at http://host:port/ from a daemon thread and returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,145 @@
+import hashlib
+import importlib.util
+import io
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+import metrics
+
+# Limits that keep a dense PDF from producing an unbounded prompt: about 10 pages / 10k tokens
+MAX_PAGES = 10
+MAX_CHARS = 40_000
+# Number of extracted PDFs kept in memory, shared by every session
+CACHE_ENTRIES = 64
+
+
+class ExtractedText(NamedTuple):
+    text: str
+    pages: int
+    truncated: bool
+
+
+def _pymupdf_pages(data):
+    import fitz
+    with fitz.open(stream=data, filetype="pdf") as document:
+        for page in document:
+            yield page.get_text
+
+
+def _pypdfium2_pages(data):
+    import pypdfium2
+    document = pypdfium2.PdfDocument(data)
+    try:
+        for page in document:
+            def read(page=page):
+                text_page = page.get_textpage()
+                try:
+                    return text_page.get_text_range()
+                finally:
+                    text_page.close()
+            yield read
+            page.close()
+    finally:
+        document.close()
+
+
+def _pypdf_pages(data):
+    import pypdf
+    for page in pypdf.PdfReader(io.BytesIO(data)).pages:
+        yield lambda page=page: page.extract_text() or ""
+
+
+def _pypdf2_pages(data):
+    import PyPDF2
+    for page in PyPDF2.PdfReader(io.BytesIO(data)).pages:
+        yield lambda page=page: page.extract_text() or ""
+
+
+# Extractor backends, fastest first, with the module each one needs. Each backend yields one
+# reader per page, and only calling the reader extracts the page's text
+EXTRACTORS = {
+    "pymupdf": ("fitz", _pymupdf_pages),
+    "pypdfium2": ("pypdfium2", _pypdfium2_pages),
+    "pypdf": ("pypdf", _pypdf_pages),
+    "PyPDF2": ("PyPDF2", _pypdf2_pages),
+}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def available_extractors():
+    """Returns the names of the extractor backends that are installed, fastest first."""
+    return [name for name, (module, _) in EXTRACTORS.items() if importlib.util.find_spec(module) is not None]
+
+
+def _page_readers(data, extractor=None):
+    """Yields a reader for each page of the PDF in data, using the named backend or the fastest one installed."""
+    if extractor is None:
+        installed = available_extractors()
+        if not installed:
+            raise RuntimeError("No PDF extractor is installed; install PyPDF2")
+        extractor = installed[0]
+    _, pages = EXTRACTORS[extractor]
+    return pages(data)
+
+
+def iter_pages(data, extractor=None):
+    """Yields the text of each page of the PDF in data (bytes), one page at a time.
+
+    Uses the named extractor backend, or the fastest one installed.
+    """
+    for read in _page_readers(data, extractor):
+        yield read()
+
+
+def extract_text(data, max_pages=MAX_PAGES, max_chars=MAX_CHARS, extractor=None):
+    """Returns the text of the PDF in data as an ExtractedText, cut at max_pages pages or max_chars characters.
+
+    The limits are checked before each page, so the text of pages past them is never extracted.
+    Results are cached by the SHA-256 of data, so reruns and repeat uploads of the same file skip
+    parsing altogether.
+    """
+    start = time.perf_counter()
+    key = (hashlib.sha256(data).hexdigest(), extractor, max_pages, max_chars)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            result = _cache[key]
+            metrics.record("extraction", cached=True, seconds=time.perf_counter() - start,
+                           pages=result.pages, chars=len(result.text), truncated=result.truncated)
+            return result
+
+    parts = []
+    chars = 0
+    pages = 0
+    truncated = False
+    for read in _page_readers(data, extractor):
+        if pages == max_pages or chars >= max_chars:
+            truncated = True
+            break
+        text = read()
+        parts.append(text)
+        chars += len(text)
+        pages += 1
+    text = "".join(parts)
+    if len(text) > max_chars:
+        text = text[:max_chars]
+        truncated = True
+    result = ExtractedText(text, pages, truncated)
+
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    metrics.record("extraction", cached=False, seconds=time.perf_counter() - start,
+                   pages=pages, chars=len(text), truncated=truncated)
+    return result
+
+
+def clear_cache():
+    """Forgets every cached extraction."""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,246 @@
+import queue
+import threading
+import time
+
+import metrics
+from scheduler import CallCancelled, LLMError, RequestScheduler
+
+
+class Superseded(LLMError):
+    """Raised inside an attempt whose hedged twin produced output first; its result is discarded."""
+
+
+class Provider:
+    """One chat model together with the scheduler that holds its quota."""
+
+    def __init__(self, name, llm, scheduler):
+        self.name = name
+        self.llm = llm
+        self.scheduler = scheduler
+        self.failures = 0
+        self.down_until = 0.0
+
+    @property
+    def model(self):
+        return getattr(self.llm, "model_name", None) or getattr(self.llm, "model", None)
+
+
+def _groq_chat_model(settings, connections):
+    import httpx
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        model=settings["model"],
+        groq_api_key=settings["api_key"],
+        temperature=settings.get("temperature", 0),
+        http_client=httpx.Client(limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections)),
+    )
+
+
+def _cohere_chat_model(settings, connections):
+    from langchain_cohere import ChatCohere
+    return ChatCohere(model=settings["model"], cohere_api_key=settings["api_key"], temperature=settings.get("temperature", 0))
+
+
+def _google_chat_model(settings, connections):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=settings["model"], google_api_key=settings["api_key"],
+                                  temperature=settings.get("temperature", 0))
+
+
+def _stub_chat_model(settings, connections):
+    from stub_llm import StubChatModel
+    return StubChatModel(**settings)
+
+
+# Chat model builders by provider kind; each imports its client library only when it is used
+CHAT_MODELS = {
+    "groq": _groq_chat_model,
+    "cohere": _cohere_chat_model,
+    "google": _google_chat_model,
+    "stub": _stub_chat_model,
+}
+
+# Provider settings that configure its scheduler rather than its chat model
+SCHEDULER_SETTINGS = ("requests_per_minute", "tokens_per_minute", "max_concurrency")
+
+
+def build_provider(name, settings, scheduler=None):
+    """Builds a Provider from its settings: kind (a key of CHAT_MODELS), the chat model's own settings
+    (model, api_key, temperature, or the StubChatModel fields) and optionally its quota.
+
+    The provider gets its own RequestScheduler unless one is passed in.
+    """
+    settings = dict(settings)
+    kind = settings.pop("kind")
+    limits = {key: settings.pop(key) for key in SCHEDULER_SETTINGS if key in settings}
+    scheduler = scheduler or RequestScheduler(**limits)
+    return Provider(name, CHAT_MODELS[kind](settings, scheduler.max_concurrency), scheduler)
+
+
+class Router:
+    """Sends each LLM call to the providers its route lists, in order, failing over when one errors.
+
+    routes maps call names (e.g. "struct", or "quick_struct" and "struct_section" through their
+    dimension) to lists of provider names; other calls use default. A provider that fails
+    failure_threshold times in a row is tried last for cooldown seconds. With hedge_after set, a
+    call that has produced no output after that many seconds gets a second, hedged request on the
+    next provider in its route (or the same one if it is the only one), and whichever answers
+    first wins.
+    """
+
+    def __init__(self, providers, routes=None, default=None, hedge_after=None, failure_threshold=3, cooldown=60.0):
+        self.providers = providers
+        self.routes = routes or {}
+        self.default = list(default or providers)
+        self.hedge_after = hedge_after
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.hedges = 0
+        self.failovers = 0
+        self._lock = threading.Lock()
+
+    def _names(self, name):
+        return self.routes.get(name) or self.routes.get(name.removeprefix("quick_").removesuffix("_section")) or self.default
+
+    def route(self, name):
+        """Returns the providers for the call name, the ones cooling down after errors last."""
+        providers = [self.providers[provider] for provider in self._names(name)]
+        now = time.monotonic()
+        return sorted(providers, key=lambda provider: provider.down_until > now)
+
+    def model_key(self, name):
+        """Names the models of the call's route, for cache keys that hold whichever of them answered."""
+        return ",".join(str(self.providers[provider].model) for provider in self._names(name))
+
+    def _succeeded(self, provider):
+        with self._lock:
+            provider.failures = 0
+
+    def _failed(self, provider, name, error, next_provider):
+        with self._lock:
+            provider.failures += 1
+            if provider.failures >= self.failure_threshold:
+                provider.down_until = time.monotonic() + self.cooldown
+            if next_provider is not None:
+                self.failovers += 1
+        if next_provider is not None:
+            metrics.record("llm_failover", name=name, provider=provider.name, to=next_provider.name, error=str(error))
+
+    def run(self, name, call, priority=0, tokens=0, on_token=None):
+        """Runs call(provider, claim, emit) on the call's providers and returns the first successful result.
+
+        call must run claim() before it hands out any output (its first streamed chunk, or its
+        result); claim raises Superseded in an attempt that lost a hedged race. Once an attempt
+        has claimed, its errors are raised rather than failed over, since its output is out.
+        A streaming call passes each chunk to emit, which hands it to on_token in the thread that
+        called run, even when the attempt runs in another. CallCancelled is raised as it is,
+        without counting against the provider.
+        """
+        providers = self.route(name)
+        if self.hedge_after is None:
+            return self._run_in_turn(name, providers, call, priority, tokens, on_token)
+        return self._run_hedged(name, providers, call, priority, tokens, on_token)
+
+    def _run_in_turn(self, name, providers, call, priority, tokens, on_token):
+        claimed = []
+
+        def claim():
+            claimed.append(True)
+
+        for index, provider in enumerate(providers):
+            try:
+                result = provider.scheduler.run(lambda: call(provider, claim, on_token), priority, tokens)
+            except CallCancelled:
+                # The caller stopped the call; the provider did nothing wrong
+                raise
+            except LLMError as e:
+                next_provider = providers[index + 1] if index + 1 < len(providers) and not claimed else None
+                self._failed(provider, name, e, next_provider)
+                if next_provider is None:
+                    raise
+                continue
+            self._succeeded(provider)
+            return result
+
+    def _run_hedged(self, name, providers, call, priority, tokens, on_token):
+        # The attempts run in threads and put their chunks and outcomes here, for the calling thread to deliver
+        outcomes = queue.Queue()
+        attempts = []
+        winner = []
+        stopped = []
+        lock = threading.Lock()
+
+        def launch(provider):
+            index = len(attempts)
+            attempts.append(provider)
+
+            def claim():
+                with lock:
+                    if not winner:
+                        winner.append(index)
+                    if winner[0] != index:
+                        raise Superseded(f"A hedged request to {attempts[winner[0]].name} answered first")
+
+            def emit(text):
+                if stopped:
+                    raise stopped[0]
+                outcomes.put(("chunk", index, text))
+
+            def start():
+                # A request still waiting for its turn when the race is won is not sent at all
+                with lock:
+                    if winner:
+                        raise Superseded(f"A hedged request to {attempts[winner[0]].name} answered first")
+                return call(provider, claim, emit if on_token is not None else None)
+
+            def attempt():
+                try:
+                    outcomes.put(("done", index, provider.scheduler.run(start, priority, tokens), None))
+                except Exception as e:
+                    outcomes.put(("done", index, None, e if isinstance(e, LLMError) else LLMError(str(e))))
+
+            metrics.start_thread(attempt)
+
+        remaining = list(providers)
+        launch(remaining.pop(0))
+        running = 1
+        hedged = False
+        error = None
+        while running:
+            timeout = self.hedge_after if not hedged and not winner else None
+            try:
+                outcome = outcomes.get(timeout=timeout)
+            except queue.Empty:
+                hedged = True
+                provider = remaining.pop(0) if remaining else attempts[0]
+                with self._lock:
+                    self.hedges += 1
+                metrics.record("llm_hedge", name=name, provider=attempts[0].name, to=provider.name)
+                launch(provider)
+                running += 1
+                continue
+            if outcome[0] == "chunk":
+                try:
+                    on_token(outcome[2])
+                except Exception as e:
+                    # Stops the attempt at its next chunk
+                    stopped.append(e)
+                    raise
+                continue
+            _, index, result, error = outcome
+            running -= 1
+            if error is None:
+                self._succeeded(attempts[index])
+                return result
+            if isinstance(error, Superseded):
+                continue
+            if isinstance(error, CallCancelled):
+                raise error
+            next_provider = remaining[0] if remaining and not running and winner != [index] else None
+            self._failed(attempts[index], name, error, next_provider)
+            if winner == [index]:
+                raise error
+            if next_provider is not None:
+                launch(remaining.pop(0))
+                running += 1
+        raise error
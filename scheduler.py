@@ -0,0 +1,146 @@
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+
+
+class LLMError(Exception):
+    """Raised when an LLM call fails and produces no analysis."""
+
+
+class CallCancelled(LLMError):
+    """Raised by the caller to stop its own call, e.g. from its on_token callback; not a failure of the provider."""
+
+
+class RateLimitError(LLMError):
+    """Raised when the provider rejects a call for exceeding its rate limit.
+
+    wait_seconds is the wait time the provider asked for, or None if it did not say.
+    """
+
+    def __init__(self, message, wait_seconds=None):
+        super().__init__(message)
+        self.wait_seconds = wait_seconds
+
+
+# Groq reports e.g. "Rate limit reached for model ... Please try again in 1m2.5s." (or "in 7.5s", "in 250ms")
+RATE_LIMIT_PATTERN = re.compile(r"Rate limit reached.*\bin (\d[\d.hms]*)", re.S)
+WAIT_PART_PATTERN = re.compile(r"([\d.]+)(h|ms|m|s)")
+WAIT_UNITS = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+
+
+def parse_rate_limit(text):
+    """Returns the wait time in seconds from a Groq rate limit message, or None if text is not one."""
+    match = RATE_LIMIT_PATTERN.search(text)
+    if not match:
+        return None
+    return sum(float(value) * WAIT_UNITS[unit] for value, unit in WAIT_PART_PATTERN.findall(match.group(1)))
+
+
+class TokenBucket:
+    """Allows up to per_minute units per minute, refilled continuously, with bursts up to one minute's worth."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Returns how many seconds to wait before amount units are available."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class RequestScheduler:
+    """Shares one LLM quota between every thread and Streamlit session in the process.
+
+    Callers are served in order of (priority, arrival), lower priority first, with at most
+    max_concurrency calls in flight. Each call waits for the request bucket and, if
+    tokens_per_minute is set, the token bucket. A RateLimitError pauses every caller for the
+    wait time the provider asked for (or an exponential backoff) and the call is retried up to
+    max_retries times; waits longer than max_wait are not retried.
+    """
+
+    def __init__(self, requests_per_minute=30, tokens_per_minute=None, max_concurrency=5,
+                 max_retries=3, base_delay=1.0, max_wait=60.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_wait = max_wait
+        self.retries = 0
+        self._waiting = []
+        self._arrivals = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+
+    def _wait_time(self, tokens):
+        wait = max(self._paused_until - time.monotonic(), self.requests.wait_time(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(tokens))
+        return wait
+
+    def _acquire(self, priority, tokens):
+        with self._cond:
+            ticket = (priority, next(self._arrivals))
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                if self._waiting[0] == ticket and self._in_flight < self.max_concurrency:
+                    wait = self._wait_time(tokens)
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            heapq.heappop(self._waiting)
+            self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            self._in_flight += 1
+            self._cond.notify_all()
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _pause(self, seconds):
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.retries += 1
+            self._cond.notify_all()
+
+    def run(self, call, priority=0, tokens=0):
+        """Runs call() once the quota allows it and returns its result, retrying on RateLimitError.
+
+        tokens is the estimated number of tokens the call will use.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._acquire(priority, tokens)
+            try:
+                return call()
+            except RateLimitError as e:
+                delay = e.wait_seconds if e.wait_seconds is not None else self.base_delay * 2 ** attempt
+                if attempt == self.max_retries or delay > self.max_wait:
+                    raise
+                # A little jitter keeps the sessions that were paused together from retrying together
+                self._pause(delay + random.uniform(0, self.base_delay))
+            finally:
+                self._release()
@@ -0,0 +1,514 @@
+"""Headless evaluation service: a persistent job queue, a pool of workers and a JSON API over HTTP.
+
+    python service.py --port 8080 --workers 4           # API and workers in one process
+    python service.py --port 8080 --workers 0           # API only
+    python service.py --workers 4 --no-api              # workers only, sharing the API's --db
+    python service.py --host 0.0.0.0 --token SECRET     # reachable from other hosts
+
+Processes that share the SQLite database (--db, default jobs.sqlite3) share the queue, so API and
+worker processes can be scaled separately. A running job's worker renews its lease every
+LEASE_SECONDS / 3; a job whose lease runs out is handed to another worker, and the first worker
+stops at its next event. Run it from the repository root so the Streamlit secrets
+(Groq_API_Key) are found.
+
+The API listens on 127.0.0.1 unless --host says otherwise, and other hosts are only allowed with
+--token (or the SERVICE_TOKEN environment variable): every request but /healthz must then send
+"Authorization: Bearer <token>", since jobs hold CVs and spend the LLM quota.
+
+    POST   /jobs                {"job_description": ..., "cv_content": ... or "cv_pdf": base64,
+                                 "quick": false, "single_call": false, "max_concurrency": 5}
+                                -> 202 {"id": ..., "status": "queued"}
+    GET    /jobs/<id>           status, and once done: results, errors, scores and overall
+    GET    /jobs/<id>/events    events after ?after=<seq>, as JSON
+    GET    /jobs/<id>/stream    the same events as server-sent events, until the job finishes
+    DELETE /jobs/<id>           cancels a job that is still queued
+    GET    /healthz             number of queued and running jobs
+
+Events are {"seq", "name", "kind", "data"}, with the names and kinds of backend.stream_evaluation:
+"token" events carry batches of streamed text, then each name ends with "result" or "error".
+"""
+import argparse
+import base64
+import hmac
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from urllib.request import Request, urlopen
+
+import metrics
+from scheduler import CallCancelled
+
+# Seconds a running job may go without a heartbeat before another worker takes it over
+LEASE_SECONDS = 120
+# Times a job is started before it is given up as failed, e.g. when it keeps crashing its worker
+MAX_ATTEMPTS = 3
+# Streamed text is stored at most this often per evaluation, so clients receive it in batches
+TOKEN_FLUSH_SECONDS = 0.25
+# Finished jobs and their events are deleted after this many seconds
+MAX_AGE = 7 * 24 * 3600
+# Largest request body accepted, enough for a 1 MB PDF in base64
+MAX_BODY_BYTES = 4 * 1024 * 1024
+# Upper bound on a job's max_concurrency option, the prompts it may have in flight at once
+MAX_JOB_CONCURRENCY = 16
+FINISHED = ("done", "failed", "cancelled")
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY, status TEXT NOT NULL, created REAL NOT NULL, updated REAL NOT NULL,
+    worker TEXT, attempts INTEGER NOT NULL DEFAULT 0, cv_content TEXT, cv_pdf BLOB,
+    job_description TEXT NOT NULL, options TEXT NOT NULL, outcome TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, name TEXT NOT NULL, kind TEXT NOT NULL, data TEXT
+);
+CREATE INDEX IF NOT EXISTS events_by_job ON events (job_id, seq);
+"""
+
+
+class JobStore:
+    """The job queue and each job's events, in a SQLite database that several processes can share."""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def submit(self, job_description, cv_content=None, cv_pdf=None, options=None):
+        """Queues an evaluation of the CV (text, or PDF bytes) against the job description and returns its ID."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO jobs (id, status, created, updated, cv_content, cv_pdf, job_description, options) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+                (job_id, now, now, cv_content, cv_pdf, job_description, json.dumps(options or {})),
+            )
+        return job_id
+
+    def get(self, job_id, inputs=False):
+        """Returns the job as a dict, with its CV and job description if inputs, or None if there is no such job."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT id, status, created, updated, attempts, options, outcome, cv_content, cv_pdf, job_description "
+                "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {"id": row[0], "status": row[1], "created": row[2], "updated": row[3], "attempts": row[4],
+               "options": json.loads(row[5]), **json.loads(row[6] or "{}")}
+        if inputs:
+            job.update(cv_content=row[7], cv_pdf=row[8], job_description=row[9])
+        return job
+
+    def events(self, job_id, after=0):
+        """Returns the job's events with a sequence number above after, oldest first."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT seq, name, kind, data FROM events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after)).fetchall()
+        return [{"seq": seq, "name": name, "kind": kind, "data": json.loads(data)} for seq, name, kind, data in rows]
+
+    def add_event(self, job_id, worker, name, kind, data):
+        """Stores one event of a job that worker is running and renews its lease.
+
+        Returns False, storing nothing, if worker no longer holds the job's lease.
+        """
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                held = db.execute("UPDATE jobs SET updated = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                                  (time.time(), job_id, worker)).rowcount == 1
+                if held:
+                    db.execute("INSERT INTO events (job_id, name, kind, data) VALUES (?, ?, ?, ?)",
+                               (job_id, name, kind, json.dumps(data, default=str)))
+            finally:
+                db.execute("COMMIT")
+        return held
+
+    def heartbeat(self, job_id, worker):
+        """Renews the lease worker holds on a running job and returns whether it still held it."""
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE jobs SET updated = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time(), job_id, worker))
+        return cursor.rowcount == 1
+
+    def claim(self, worker):
+        """Takes the oldest queued job for worker and returns it with its inputs, or returns None.
+
+        Running jobs whose lease has expired are queued again first, or failed after MAX_ATTEMPTS.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                expired = now - LEASE_SECONDS
+                db.execute("UPDATE jobs SET status = 'failed', updated = ?, outcome = ? "
+                           "WHERE status = 'running' AND updated < ? AND attempts >= ?",
+                           (now, json.dumps({"errors": {"job": "The job stopped its worker too many times"}}),
+                            expired, MAX_ATTEMPTS))
+                db.execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND updated < ?",
+                           (expired,))
+                row = db.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1").fetchone()
+                if row is not None:
+                    db.execute("UPDATE jobs SET status = 'running', worker = ?, updated = ?, attempts = attempts + 1 "
+                               "WHERE id = ?", (worker, now, row[0]))
+                    # Events of an attempt that was cut off would be repeated by this one
+                    db.execute("DELETE FROM events WHERE job_id = ?", (row[0],))
+            finally:
+                db.execute("COMMIT")
+        if row is None:
+            return None
+        return {**self.get(row[0], inputs=True), "worker": worker}
+
+    def finish(self, job_id, worker, status, **outcome):
+        """Records the final status and outcome (results, errors, scores, overall) of a job worker is running.
+
+        Returns False, recording nothing, if worker no longer holds the job's lease.
+        """
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE jobs SET status = ?, updated = ?, outcome = ?, cv_pdf = NULL "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (status, time.time(), json.dumps(outcome, default=str), job_id, worker))
+        return cursor.rowcount == 1
+
+    def cancel(self, job_id):
+        """Cancels the job if it has not started yet and returns whether it did."""
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE jobs SET status = 'cancelled', updated = ? WHERE id = ? AND status = 'queued'", (time.time(), job_id))
+        return cursor.rowcount == 1
+
+    def counts(self):
+        """Returns the number of jobs in each status."""
+        with self._lock:
+            return dict(self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def prune(self, max_age=MAX_AGE):
+        """Deletes finished jobs, and their events, last updated more than max_age seconds ago."""
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            old = f"SELECT id FROM jobs WHERE status IN {FINISHED} AND updated < ?"
+            cutoff = time.time() - max_age
+            db.execute(f"DELETE FROM events WHERE job_id IN ({old})", (cutoff,))
+            db.execute(f"DELETE FROM jobs WHERE id IN ({old})", (cutoff,))
+            db.execute("COMMIT")
+
+
+class LeaseLost(CallCancelled):
+    """Raised in a job whose lease another worker has taken over, to stop its LLM calls."""
+
+
+def run_job(store, job):
+    """Evaluates one claimed job, storing its events as they happen, then records the outcome.
+
+    A heartbeat thread renews the job's lease while it runs, through quiet stretches such as
+    quick mode, section notes of long CVs or rate limit pauses. Raises LeaseLost at the next
+    event once the lease has gone to another worker.
+    """
+    metrics.start_trace(job["options"].get("trace_id") or job["id"])
+    finished = threading.Event()
+    lease_lost = threading.Event()
+
+    def heartbeat():
+        while not finished.wait(LEASE_SECONDS / 3):
+            if not store.heartbeat(job["id"], job["worker"]):
+                lease_lost.set()
+                return
+
+    def add_event(name, kind, data):
+        if lease_lost.is_set() or not store.add_event(job["id"], job["worker"], name, kind, data):
+            lease_lost.set()
+            raise LeaseLost(f"Job {job['id']} was taken over by another worker")
+
+    metrics.start_thread(heartbeat)
+    try:
+        _evaluate_job(store, job, add_event, lease_lost)
+    finally:
+        finished.set()
+
+
+def _evaluate_job(store, job, add_event, lease_lost):
+    from backend import DIMENSIONS, MAX_CONCURRENCY, evaluate_all, extract_score, overall_score
+    from pdf_extract import extract_text
+
+    options = job["options"]
+    cv_content = job["cv_content"]
+    if cv_content is None:
+        extracted = extract_text(job["cv_pdf"])
+        cv_content = extracted.text
+        add_event("extraction", "extracted", {"pages": extracted.pages, "truncated": extracted.truncated})
+    if not cv_content.strip():
+        store.finish(job["id"], job["worker"], "failed", errors={"extraction": "No text could be extracted from the PDF"})
+        return
+
+    pending = {}
+    flushed = {}
+    lock = threading.Lock()
+
+    def on_event(name, kind, data):
+        with lock:
+            if lease_lost.is_set():
+                raise LeaseLost(f"Job {job['id']} was taken over by another worker")
+            if kind == "token":
+                pending.setdefault(name, []).append(data)
+                if time.monotonic() - flushed.get(name, 0.0) < TOKEN_FLUSH_SECONDS:
+                    return
+                data = "".join(pending.pop(name))
+                flushed[name] = time.monotonic()
+            else:
+                # The result holds the whole text, so unsent tokens are dropped
+                pending.pop(name, None)
+                data = str(data) if kind == "error" else data
+            add_event(name, kind, data)
+
+    quick = options.get("quick", False)
+    results, errors = evaluate_all(cv_content, job["job_description"], options.get("max_concurrency", MAX_CONCURRENCY),
+                                   on_event=on_event, single_call=options.get("single_call", False), quick=quick)
+    scores = {name: results[name]["score"] if quick else extract_score(results[name])
+              for name in DIMENSIONS if name in results}
+    if lease_lost.is_set():
+        raise LeaseLost(f"Job {job['id']} was taken over by another worker")
+    store.finish(job["id"], job["worker"], "done", results=results, errors={name: str(error) for name, error in errors.items()},
+                 scores=scores, overall=overall_score(scores) if len(scores) == len(DIMENSIONS) else None)
+
+
+class WorkerPool:
+    """Threads that take jobs from the store and run them, workers at a time."""
+
+    def __init__(self, store, workers=2, poll_interval=0.5):
+        self.store = store
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(number,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Lets every worker finish its current job, then stops them."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self, number):
+        worker = f"{socket.gethostname()}:{os.getpid()}:{number}"
+        pruned = 0.0
+        while not self._stop.is_set():
+            if number == 0 and time.monotonic() - pruned > 3600:
+                self.store.prune()
+                pruned = time.monotonic()
+            job = self.store.claim(worker)
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            try:
+                run_job(self.store, job)
+            except LeaseLost:
+                # The worker that took the job over records its outcome
+                pass
+            except Exception as e:
+                self.store.finish(job["id"], worker, "failed", errors={"job": f"{type(e).__name__}: {e}"})
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _job_path(self):
+        """Returns (job ID, sub-resource, query) for /jobs/<id>[/<sub-resource>], or None."""
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        if len(parts) not in (2, 3) or parts[0] != "jobs":
+            return None
+        return parts[1], parts[2] if len(parts) == 3 else None, parse_qs(url.query)
+
+    def _authorized(self):
+        """Checks the bearer token when the server has one, answering 401 when it is missing or wrong."""
+        token = self.server.token
+        if token is None or hmac.compare_digest(self.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()):
+            return True
+        self._send_json(401, {"error": "A valid bearer token is required"})
+        return False
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if urlparse(self.path).path.rstrip("/") != "/jobs":
+            return self._send_json(404, {"error": "Not found"})
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            return self._send_json(413, {"error": f"The request body is over {MAX_BODY_BYTES} bytes"})
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("it must be a JSON object")
+            cv_pdf = base64.b64decode(body["cv_pdf"], validate=True) if body.get("cv_pdf") else None
+        except ValueError as e:
+            return self._send_json(400, {"error": f"The request body is not valid: {e}"})
+        if not body.get("job_description") or not (body.get("cv_content") or cv_pdf):
+            return self._send_json(400, {"error": "job_description and one of cv_content or cv_pdf are required"})
+        concurrency = body.get("max_concurrency")
+        if concurrency is not None and (type(concurrency) is not int or not 1 <= concurrency <= MAX_JOB_CONCURRENCY):
+            return self._send_json(400, {"error": f"max_concurrency must be a whole number from 1 to {MAX_JOB_CONCURRENCY}"})
+        options = {key: body[key] for key in ("quick", "single_call", "trace_id", "max_concurrency") if key in body}
+        job_id = self.server.store.submit(body["job_description"], body.get("cv_content"), cv_pdf, options)
+        self._send_json(202, {"id": job_id, "status": "queued"})
+
+    def do_GET(self):
+        if urlparse(self.path).path.rstrip("/") == "/healthz":
+            return self._send_json(200, self.server.store.counts())
+        if not self._authorized():
+            return
+        route = self._job_path()
+        job = self.server.store.get(route[0]) if route else None
+        if job is None:
+            return self._send_json(404, {"error": "No such job"})
+        job_id, resource, query = route
+        try:
+            after = int(query.get("after", ["0"])[0])
+        except ValueError:
+            return self._send_json(400, {"error": "after must be an event sequence number"})
+        if resource is None:
+            return self._send_json(200, job)
+        if resource == "events":
+            return self._send_json(200, {"status": job["status"], "events": self.server.store.events(job_id, after)})
+        if resource == "stream":
+            return self._stream(job_id, after)
+        self._send_json(404, {"error": "Not found"})
+
+    def _stream(self, job_id, after):
+        """Sends the job's events as server-sent events until it finishes and every event is out."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while True:
+                # Read the status first, so no event stored before the job finished is missed
+                status = self.server.store.get(job_id)["status"]
+                for event in self.server.store.events(job_id, after):
+                    after = event["seq"]
+                    self.wfile.write(f"id: {after}\nevent: {event['kind']}\ndata: {json.dumps(event)}\n\n".encode())
+                if status in FINISHED:
+                    self.wfile.write(f"event: end\ndata: {json.dumps({'status': status})}\n\n".encode())
+                    return
+                self.wfile.flush()
+                time.sleep(self.server.poll_interval)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; the job carries on and can be streamed again from its last event ID
+            pass
+
+    def do_DELETE(self):
+        if not self._authorized():
+            return
+        route = self._job_path()
+        if route is None or route[1] is not None or self.server.store.get(route[0]) is None:
+            return self._send_json(404, {"error": "No such job"})
+        if not self.server.store.cancel(route[0]):
+            return self._send_json(409, {"error": "Only queued jobs can be cancelled"})
+        self._send_json(200, {"id": route[0], "status": "cancelled"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_api(store, port, host="127.0.0.1", poll_interval=0.2, token=None):
+    """Serves the job API for store at http://host:port/ from a daemon thread and returns the server.
+
+    With token, every request but /healthz must carry it as "Authorization: Bearer <token>".
+    """
+    server = ThreadingHTTPServer((host, port), _ServiceHandler)
+    server.daemon_threads = True
+    server.store = store
+    server.token = token
+    server.poll_interval = poll_interval
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def remote_evaluation(url, cv_content, job_description, single_call=False, quick=False, trace_id=None, token=None):
+    """Submits an evaluation to the service at url and yields its (name, kind, data) events as they happen.
+
+    The events match backend.stream_evaluation's, except that errors arrive as their message text.
+    token is the service's bearer token, if it has one.
+    """
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    options = {"single_call": single_call, "quick": quick, "trace_id": trace_id or metrics.current_trace()}
+    request = Request(f"{url.rstrip('/')}/jobs", method="POST", headers={"Content-Type": "application/json", **headers},
+                      data=json.dumps({"cv_content": cv_content, "job_description": job_description, **options}).encode())
+    with urlopen(request) as response:
+        job_id = json.load(response)["id"]
+    with urlopen(Request(f"{url.rstrip('/')}/jobs/{job_id}/stream", headers=headers)) as response:
+        for line in response:
+            if line.startswith(b"data: "):
+                event = json.loads(line[len(b"data: "):])
+                if event.get("kind") in ("token", "result", "error"):
+                    yield event["name"], event["kind"], event["data"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="jobs.sqlite3", help="SQLite database shared by every API and worker process")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on; other than loopback needs --token")
+    parser.add_argument("--token", default=os.environ.get("SERVICE_TOKEN"),
+                        help="bearer token clients must send (default: the SERVICE_TOKEN environment variable)")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=2, help="jobs run at the same time by this process")
+    parser.add_argument("--no-api", action="store_true", help="only run workers")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve this process's Prometheus metrics on this port (one per process)")
+    args = parser.parse_args(argv)
+    if not args.no_api and args.host not in LOOPBACK_HOSTS and not args.token:
+        parser.error(f"--host {args.host} makes the API reachable from other hosts and needs --token")
+
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+    store = JobStore(args.db)
+    pool = WorkerPool(store, args.workers)
+    pool.start()
+    if not args.no_api:
+        start_api(store, args.port, args.host, token=args.token)
+        print(f"Serving the job API on http://{args.host}:{args.port}/ with {args.workers} workers", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("Stopping after the running jobs finish", file=sys.stderr)
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import json
+import os
+import zlib
+
+import numpy as np
+
+from local_analysis import terms
+
+# Terms are hashed into this many features, so the index needs no vocabulary and never has to be refitted
+N_FEATURES = 2 ** 20
+# Added CVs are merged into the sorted postings once they hold this many postings
+MERGE_POSTINGS = 2_000_000
+
+ARRAYS = ("features", "slots", "weights")
+
+
+def hashed_features(text):
+    """Returns the hashed features of text's terms and each feature's weight, 1 + log(count), as sorted arrays."""
+    hashes = np.fromiter((zlib.crc32(term.encode()) for term in terms(text)), dtype=np.uint32)
+    features, counts = np.unique((hashes % N_FEATURES).astype(np.int32), return_counts=True)
+    return features, (1 + np.log(counts)).astype(np.float32)
+
+
+def _ranges(starts, ends):
+    """Returns the indices of every range starts[i]:ends[i], concatenated."""
+    lengths = ends - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(lengths.sum())
+
+
+class ShortlistIndex:
+    """Ranks indexed CV texts against a job description by TF-IDF similarity, without any LLM call.
+
+    Each CV is a column of a sparse term matrix: the hashed features of its words and word pairs,
+    with length-normalized 1 + log(count) weights. The matrix is kept as postings sorted by
+    feature (features, slots, weights), so a query only reads the columns' entries for the job
+    description's features. The job description's features are weighted by IDF over the CVs
+    currently indexed, so ranking stays correct as CVs are added and removed.
+
+    Added CVs go to a pending segment that queries scan directly, and removed CVs are only
+    masked, until merge() (run by save(), or once MERGE_POSTINGS are pending) sorts them into
+    the postings. With a path, the index is saved to and loaded from that directory, and the
+    postings are memory-mapped rather than read into memory.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.keys = []
+        self.stamps = []
+        self._slots = {}
+        self.document_frequency = np.zeros(N_FEATURES, dtype=np.int32)
+        self._postings = {name: np.zeros(0, dtype) for name, dtype in zip(ARRAYS, (np.int32, np.int32, np.float32))}
+        self._pending = []
+        self._pending_arrays = None
+        self._removed = []
+        if path is not None and os.path.exists(os.path.join(path, "index.json")):
+            self._load()
+
+    def _load(self):
+        with open(os.path.join(self.path, "index.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["n_features"] != N_FEATURES:
+            raise ValueError(f"The index at {self.path} was built with {meta['n_features']} features, not {N_FEATURES}")
+        self.keys = meta["keys"]
+        self.stamps = meta["stamps"]
+        self._slots = {key: slot for slot, key in enumerate(self.keys)}
+        self.document_frequency = np.load(os.path.join(self.path, "document_frequency.npy"))
+        self._postings = {name: np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    def stamp(self, key):
+        """Returns the stamp the CV was added with (e.g. its file's modification time), or None."""
+        return self.stamps[self._slots[key]] if key in self._slots else None
+
+    def add(self, key, text, stamp=None):
+        """Indexes the CV text under key, replacing any CV already indexed under it."""
+        if key in self._slots:
+            self.remove(key)
+        features, weights = hashed_features(text)
+        if len(weights):
+            weights /= np.linalg.norm(weights)
+        slot = len(self.keys)
+        self.keys.append(key)
+        self.stamps.append(stamp)
+        self._slots[key] = slot
+        self.document_frequency[features] += 1
+        self._pending.append((features, np.full(len(features), slot, dtype=np.int32), weights))
+        self._pending_arrays = None
+        if sum(len(part[0]) for part in self._pending) >= MERGE_POSTINGS:
+            self.merge()
+
+    def remove(self, key):
+        """Drops the CV indexed under key from every later ranking."""
+        slot = self._slots.pop(key)
+        self.keys[slot] = None
+        self._removed.append(slot)
+        pending = [features for features, slots, _ in self._pending if len(slots) and slots[0] == slot]
+        features = pending[0] if pending else self._postings["features"][self._postings["slots"] == slot]
+        self.document_frequency[features] -= 1
+
+    def merge(self):
+        """Sorts the pending CVs into the postings and drops the removed ones, renumbering the slots."""
+        parts = [tuple(self._postings[name] for name in ARRAYS), *self._pending]
+        features, slots, weights = (np.concatenate([part[i] for part in parts]) for i in range(3))
+        live = np.array([key is not None for key in self.keys], dtype=bool)
+        renumbered = np.cumsum(live, dtype=np.int32) - 1
+        kept = live[slots]
+        order = np.argsort(features[kept], kind="stable")
+        self._postings = {"features": features[kept][order], "slots": renumbered[slots[kept]][order],
+                          "weights": weights[kept][order]}
+        self.stamps = [stamp for stamp, alive in zip(self.stamps, live) if alive]
+        self.keys = [key for key in self.keys if key is not None]
+        self._slots = {key: slot for slot, key in enumerate(self.keys)}
+        self._pending = []
+        self._pending_arrays = None
+        self._removed = []
+
+    def save(self):
+        """Merges the index and writes it to its directory; each file is replaced whole, the metadata last."""
+        self.merge()
+        os.makedirs(self.path, exist_ok=True)
+        arrays = {**self._postings, "document_frequency": self.document_frequency}
+        for name, array in arrays.items():
+            temporary = os.path.join(self.path, f"{name}.tmp.npy")
+            np.save(temporary, array)
+            os.replace(temporary, os.path.join(self.path, f"{name}.npy"))
+        temporary = os.path.join(self.path, "index.json.tmp")
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"n_features": N_FEATURES, "keys": self.keys, "stamps": self.stamps}, f)
+        os.replace(temporary, os.path.join(self.path, "index.json"))
+        self._postings = {name: np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+
+    def scores(self, job_description):
+        """Returns the similarity of every slot's CV to the job description; removed slots score -inf."""
+        features, weights = hashed_features(job_description)
+        query = weights * (np.log((1 + len(self)) / (1 + self.document_frequency[features])) + 1)
+        scores = np.zeros(len(self.keys), dtype=np.float32)
+        if not len(features):
+            scores[self._removed] = -np.inf
+            return scores
+        postings = self._postings
+        starts = np.searchsorted(postings["features"], features, "left")
+        ends = np.searchsorted(postings["features"], features, "right")
+        found = _ranges(starts, ends)
+        contributions = postings["weights"][found] * np.repeat(query, ends - starts)
+        scores += np.bincount(postings["slots"][found], contributions, minlength=len(self.keys))
+        if self._pending:
+            # Pending CVs are not sorted by feature, so each of their postings is looked up in the query
+            if self._pending_arrays is None:
+                self._pending_arrays = tuple(np.concatenate(part) for part in zip(*self._pending))
+            pending_features, slots, weights = self._pending_arrays
+            matched = np.searchsorted(features, pending_features).clip(max=len(features) - 1)
+            hits = features[matched] == pending_features
+            scores += np.bincount(slots[hits], weights[hits] * query[matched[hits]], minlength=len(self.keys))
+        scores[self._removed] = -np.inf
+        return scores
+
+    def rank(self, job_description, top_k=None, keys=None):
+        """Returns [(key, score)] for the top_k CVs (all with None) most similar to the job description,
+        best first; with keys, only those CVs are ranked.
+        """
+        scores = self.scores(job_description)
+        candidates = np.array([self._slots[key] for key in keys if key in self._slots] if keys is not None
+                              else list(self._slots.values()), dtype=np.int64)
+        if top_k is not None and top_k < len(candidates):
+            candidates = candidates[np.argpartition(-scores[candidates], top_k)[:top_k]]
+        best = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.keys[slot], float(scores[slot])) for slot in best]
@@ -0,0 +1,104 @@
+import random
+import threading
+import time
+from typing import Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+RATE_LIMIT_TEXT = (
+    "Error code: 429 - Rate limit reached for model `llama-3.1-70b-versatile` in organization `org_stub` "
+    "on tokens per minute (TPM): Limit 6000, Used 6000, Requested 1200. Please try again in {wait}."
+)
+
+
+class StubRateLimitError(Exception):
+    """Raised by StubChatModel the way the Groq client raises on HTTP 429."""
+
+
+class StubProviderError(Exception):
+    """Raised by StubChatModel for a simulated provider outage (HTTP 503)."""
+
+
+class StubChatModel(BaseChatModel):
+    """Local stand-in for ChatGroq that answers every prompt with a fixed response.
+
+    Each call waits latency seconds, then produces the response at tokens_per_second
+    (words stand in for tokens). With latency_sigma the wait is drawn from a log-normal
+    distribution with median latency, for a long tail of slow calls. Every
+    rate_limit_every-th call fails with the Groq rate limit message, raised as an exception
+    or, with rate_limit_as_content, returned as the response text, and a share error_rate
+    of the calls fails with StubProviderError. seed makes the random draws repeatable.
+    """
+
+    response: str = "1. Overall: The CV is well structured.\n2. Suggestions: Quantify achievements.\nScore: 72/100"
+    model_name: str = "stub-model"
+    temperature: float = 0
+    latency: float = 0.0
+    tokens_per_second: float = 0.0
+    rate_limit_every: int = 0
+    rate_limit_wait: str = "1.5s"
+    rate_limit_as_content: bool = False
+    latency_sigma: float = 0.0
+    error_rate: float = 0.0
+    seed: Optional[int] = None
+    calls: int = 0
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _random: random.Random = PrivateAttr(default=None)
+
+    def model_post_init(self, context):
+        self._random = random.Random(self.seed)
+
+    @property
+    def _llm_type(self):
+        return "stub-chat-model"
+
+    def _next_call(self):
+        """Counts the call and returns its number, its latency and whether it fails with an outage."""
+        with self._lock:
+            self.calls += 1
+            latency = self.latency * self._random.lognormvariate(0, self.latency_sigma) if self.latency_sigma else self.latency
+            return self.calls, latency, self._random.random() < self.error_rate
+
+    def _rate_limited(self, call):
+        return self.rate_limit_every and call % self.rate_limit_every == 0
+
+    def _chunks(self, messages, paced=True):
+        """Yields the response a word at a time, sleeping between words when paced."""
+        call, latency, outage = self._next_call()
+        time.sleep(latency)
+        if outage:
+            raise StubProviderError("Error code: 503 - Service Unavailable")
+        if self._rate_limited(call):
+            text = RATE_LIMIT_TEXT.format(wait=self.rate_limit_wait)
+            if not self.rate_limit_as_content:
+                raise StubRateLimitError(text)
+            yield text
+            return
+        words = self.response.split(" ")
+        for index, word in enumerate(words):
+            if paced and self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+            yield word if index == len(words) - 1 else word + " "
+
+    def _usage(self, messages, text):
+        input_tokens = sum(len(str(message.content).split()) for message in messages)
+        output_tokens = len(text.split())
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = "".join(self._chunks(messages, paced=False))
+        if self.tokens_per_second:
+            # One sleep for the whole reply; thousands of tiny sleeps overshoot under many threads
+            time.sleep(len(text.split()) / self.tokens_per_second)
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        parts = []
+        for text in self._chunks(messages):
+            parts.append(text)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, "".join(parts))))